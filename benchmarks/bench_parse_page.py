@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+#
+# Compares per-element href harvesting with the single execute_script call in parsePage
+# on a saved SERP fixture.
+#
+# $ python benchmarks/bench_parse_page.py [repeat]
+
+import os
+import sys
+import time
+import logging
+import pathlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from scrapebaidu.utils import parsePage
+from scrapebaidu.browserpool import createChromeBrowser
+
+def bench(browser, logger, bulk: bool, repeat: int) -> tuple[float, int, int]:
+    elapsed = 0.0
+    for _ in range(repeat):
+        url_links = []
+        page_links = []
+        started = time.perf_counter()
+        parsePage(browser, logger, '', url_links, page_links, bulk)
+        elapsed += time.perf_counter() - started
+    return elapsed / repeat, len(url_links), len(page_links)
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    logging.basicConfig()
+    logger = logging.getLogger("bench-parse-page")
+    logger.setLevel(logging.INFO)
+    fixture = pathlib.Path(__file__).parent.joinpath("fixtures", "baidu_serp.html").resolve()
+    browser = createChromeBrowser('', {"headless": True})
+    try:
+        browser.get(fixture.as_uri())
+        results = {}
+        for name, bulk in [("per-element", False), ("bulk", True)]:
+            results[name] = bench(browser, logger, bulk, repeat)
+            avg, url_count, page_count = results[name]
+            print(f"{name:12} {avg*1000:9.2f} ms/page  url links: {url_count}, page links: {page_count}")
+        print(f"speedup: {results['per-element'][0] / results['bulk'][0]:.1f}x")
+    finally:
+        browser.quit()
+
+if __name__ == '__main__':
+    main()
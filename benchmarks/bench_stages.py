@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+#
+# Runs extractBaiduLinks, checkBaiduLinks and getWhoisForHosts against local stand-ins
+# (see standins.py) and reports throughput, p50/p99 latency and peak RSS for every stage.
+# Peak RSS is the maximum of the whole process so far, the stand-in servers included.
+#
+# $ python benchmarks/bench_stages.py --keywords 50 --pages 5
+# $ python benchmarks/bench_stages.py --engine browser --keywords 5
+
+import os
+import sys
+import re
+import json
+import time
+import asyncio
+import logging
+import argparse
+import resource
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from scrapebaidu import extractBaiduLinks, checkBaiduLinks, getHostsFromCheckedBaiduLinks, getWhoisForHosts, PublicSuffixList, Metrics
+from standins import StandIns
+
+def percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+def peakRss() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+
+def stageResult(stage: str, items: int, seconds: float, samples: list[float]) -> dict:
+    return {
+        "stage": stage,
+        "items": items,
+        "seconds": round(seconds, 3),
+        "throughput": round(items / seconds, 1) if seconds else 0.0,
+        "p50_ms": round(percentile(samples, 0.5) * 1000, 1),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 1),
+        "peak_rss_mb": round(peakRss(), 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the scrape stages against local stand-ins.")
+    parser.add_argument("--engine", choices=["http", "browser"], default="http")
+    parser.add_argument("--keywords", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--links-per-page", type=int, default=10)
+    parser.add_argument("--hosts", type=int, default=1000)
+    parser.add_argument("--domains", type=int, default=500)
+    parser.add_argument("--parallel-browsers", type=int, default=1)
+    parser.add_argument("--resolve-tasks", type=int, default=32)
+    parser.add_argument("--whois-tasks", type=int, default=10)
+    parser.add_argument("--serp-latency", type=float, default=0.05)
+    parser.add_argument("--redirect-latency", type=float, default=0.01)
+    parser.add_argument("--whois-latency", type=float, default=0.05)
+    parser.add_argument("--redirect-200", type=float, default=0.05, help="share of links that answer 200")
+    parser.add_argument("--redirect-timeout", type=float, default=0.02, help="share of links that never answer")
+    parser.add_argument("--fetch-timeout", type=int, default=2)
+    parser.add_argument("--json", metavar="FILE", help="also write the results to FILE")
+    args = parser.parse_args()
+
+    logging.basicConfig()
+    logger = logging.getLogger("bench-stages")
+    logger.setLevel(logging.WARNING)
+
+    standins = StandIns({
+        "pages": args.pages,
+        "links_per_page": args.links_per_page,
+        "hosts": args.hosts,
+        "domains": args.domains,
+        "serp_latency": args.serp_latency,
+        "redirect_latency": args.redirect_latency,
+        "whois_latency": args.whois_latency,
+        "redirect_mix": {"302": 1 - args.redirect_200 - args.redirect_timeout, "200": args.redirect_200, "timeout": args.redirect_timeout},
+        "timeout_latency": args.fetch_timeout + 1
+    })
+
+    # raw latencies come from the metrics hooks, so percentiles are exact
+    metrics = Metrics()
+    samples = {}
+    metrics.addHook(lambda name, seconds, labels: samples.setdefault(name, []).append(seconds))
+
+    search_list = [f"keyword{i}" for i in range(args.keywords)]
+    reject_patterns = [
+        re.compile(r"\/\/([^\.\/]+\.)?baidu\.")
+    ]
+    loop = asyncio.new_event_loop()
+    results = []
+    with standins:
+        started = time.perf_counter()
+        baidu_link_list = list(extractBaiduLinks(logger, search_list, args.pages, [], {
+            "engine": args.engine,
+            "baidu_url": standins.serp_url,
+            "headless": True,
+            "parallel_browsers": args.parallel_browsers,
+            "loop": loop,
+            "metrics": metrics
+        }))
+        results.append(stageResult("extract", len(baidu_link_list), time.perf_counter() - started, samples.get("baidu_page_load_seconds", [])))
+
+        # extracted links point to www.baidu.com, the redirect stand-in answers them instead
+        baidu_link_list = [(standins.redirect_url + link[len("https://www.baidu.com"):], search) for link, search, pn in baidu_link_list]
+        started = time.perf_counter()
+        checked_links = list(checkBaiduLinks(logger, baidu_link_list, reject_patterns, args.resolve_tasks, loop, {
+            "fetch_timeout": args.fetch_timeout,
+            "metrics": metrics
+        }))
+        results.append(stageResult("resolve", len(checked_links), time.perf_counter() - started, samples.get("link_fetch_seconds", [])))
+
+        host_list = getHostsFromCheckedBaiduLinks(checked_links)
+        started = time.perf_counter()
+        whois_list = list(getWhoisForHosts(logger, host_list, args.whois_tasks, loop, 10, {
+            "whois_server": standins.whois_server,
+            "public_suffix_list": PublicSuffixList(),
+            "metrics": metrics
+        }))
+        results.append(stageResult("whois", len(whois_list), time.perf_counter() - started, samples.get("whois_lookup_seconds", [])))
+    loop.close()
+
+    print(f"{'stage':8} {'items':>7} {'seconds':>8} {'items/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'peak RSS MB':>12}")
+    for result in results:
+        print(f"{result['stage']:8} {result['items']:7} {result['seconds']:8.2f} {result['throughput']:9.1f} {result['p50_ms']:8.1f} {result['p99_ms']:8.1f} {result['peak_rss_mb']:12.1f}")
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump({"args": vars(args), "results": results}, fp, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+#
+# Local stand-ins for Baidu search, Baidu link redirects and a WHOIS server,
+# so benchmarks never touch the network. All answers are derived from the request,
+# the same request always gets the same answer.
+
+from aiohttp import web
+from html import escape
+from urllib.parse import quote
+import asyncio
+import threading
+import hashlib
+
+def fraction(*parts) -> float:
+    # a stable number in [0, 1) for the given request
+    digest = hashlib.md5('/'.join(str(part) for part in parts).encode('utf8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2**64
+
+class StandIns:
+    # options:
+    #   pages: SERP pages per keyword, links_per_page: /link?url= anchors per page,
+    #   hosts: number of distinct target hosts, domains: registrable domains they belong to,
+    #   serp_latency, redirect_latency, whois_latency: seconds before an answer,
+    #   redirect_mix: {"302": 0.9, "200": 0.05, "timeout": 0.05}, timeout_latency: seconds a "timeout" hangs,
+    #   whois_not_found: fraction of domains that are not registered
+    def __init__(self, options: dict = []):
+        self.pages: int = options["pages"] if "pages" in options else 5
+        self.links_per_page: int = options["links_per_page"] if "links_per_page" in options else 10
+        self.hosts: int = options["hosts"] if "hosts" in options else 1000
+        self.domains: int = options["domains"] if "domains" in options else 500
+        self.serp_latency: float = options["serp_latency"] if "serp_latency" in options else 0.05
+        self.redirect_latency: float = options["redirect_latency"] if "redirect_latency" in options else 0.01
+        self.whois_latency: float = options["whois_latency"] if "whois_latency" in options else 0.05
+        self.redirect_mix: dict = options["redirect_mix"] if "redirect_mix" in options else {"302": 0.9, "200": 0.05, "timeout": 0.05}
+        self.timeout_latency: float = options["timeout_latency"] if "timeout_latency" in options else 30
+        self.whois_not_found: float = options["whois_not_found"] if "whois_not_found" in options else 0.1
+        self.loop = None
+        self.thread = None
+        self.runners = []
+        self.whois_tcp_server = None
+        self.serp_url = None
+        self.redirect_url = None
+        self.whois_server = None
+
+    # Baidu search result pages
+
+    def serpPage(self, search: str, pn: int) -> str:
+        page = pn // 10
+        anchors = []
+        for i in range(self.links_per_page):
+            token = quote(f"{search}-{page}-{i}")
+            anchors.append(f'<div class="result c-container"><h3 class="t"><a href="http://www.baidu.com/link?url={token}">Result {i}</a></h3></div>')
+        pagination = []
+        for p in range(1, self.pages):
+            pagination.append(f'<a href="/s?wd={quote(search)}&amp;pn={p}0&amp;ie=utf-8"><span class="pc">{p+1}</span></a>')
+        return ('<!DOCTYPE html><html><head><meta charset="utf-8"><base href="https://www.baidu.com/">'
+            f'<title>{escape(search)}_百度搜索</title></head><body><div id="content_left">{"".join(anchors)}</div>'
+            f'<div id="page">{"".join(pagination)}</div></body></html>')
+
+    async def handleSerp(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.serp_latency)
+        search = request.query.get("wd", "")
+        pn = int(request.query.get("pn", "0") or 0)
+        return web.Response(text=self.serpPage(search, pn), content_type="text/html")
+
+    # Baidu link redirects
+
+    def redirectOutcome(self, token: str) -> str:
+        x = fraction("redirect", token)
+        for outcome, share in self.redirect_mix.items():
+            if x < share:
+                return outcome
+            x -= share
+        return "302"
+
+    def targetHost(self, token: str) -> str:
+        host = int(fraction("host", token) * self.hosts)
+        return f"www{host}.site{host % self.domains}.com"
+
+    async def handleLink(self, request: web.Request) -> web.Response:
+        token = request.query.get("url", "")
+        outcome = self.redirectOutcome(token)
+        if outcome == "timeout":
+            await asyncio.sleep(self.timeout_latency)
+        else:
+            await asyncio.sleep(self.redirect_latency)
+        location = f"http://{self.targetHost(token)}/{token}"
+        if outcome == "302":
+            raise web.HTTPFound(location)
+        if outcome == "301":
+            raise web.HTTPMovedPermanently(location)
+        if outcome == "200":
+            return web.Response(text="<html><body>not a redirect</body></html>", content_type="text/html")
+        return web.Response(status=int(outcome) if outcome.isdigit() else 500)
+
+    # WHOIS
+
+    async def handleWhois(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            domain = (await reader.readline()).decode('idna').strip().lower()
+            await asyncio.sleep(self.whois_latency)
+            if fraction("whois", domain) < self.whois_not_found:
+                answer = f'No match for "{domain.upper()}".\r\n'
+            else:
+                year = 2015 + int(fraction("expires", domain) * 20)
+                answer = (f"Domain Name: {domain.upper()}\r\n"
+                    f"Registrar: Stand-in Registrar\r\n"
+                    f"Creation Date: 2010-01-01T00:00:00Z\r\n"
+                    f"Registry Expiry Date: {year}-06-01T00:00:00Z\r\n")
+            writer.write(answer.encode('utf8'))
+            await writer.drain()
+        finally:
+            writer.close()
+
+    # server lifecycle
+
+    async def startServers(self):
+        serp_app = web.Application()
+        serp_app.router.add_get("/s", self.handleSerp)
+        redirect_app = web.Application()
+        redirect_app.router.add_get("/link", self.handleLink)
+        ports = []
+        for app in [serp_app, redirect_app]:
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", 0).start()
+            self.runners.append(runner)
+            ports.append(runner.addresses[0][1])
+        self.serp_url = f"http://127.0.0.1:{ports[0]}"
+        self.redirect_url = f"http://127.0.0.1:{ports[1]}"
+        self.whois_tcp_server = await asyncio.start_server(self.handleWhois, "127.0.0.1", 0)
+        self.whois_server = f"127.0.0.1:{self.whois_tcp_server.sockets[0].getsockname()[1]}"
+
+    async def stopServers(self):
+        self.whois_tcp_server.close()
+        await self.whois_tcp_server.wait_closed()
+        for runner in self.runners:
+            await runner.cleanup()
+
+    def start(self):
+        # the servers run on their own loop in a thread, the code under test keeps its own loops
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.startServers())
+            ready.set()
+            self.loop.run_forever()
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.stopServers(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
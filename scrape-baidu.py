@@ -15,14 +15,44 @@ import logging
 import asyncio
 import os
 import re
+import argparse
+import socket
+from contextlib import nullcontext
 from datetime import datetime
 
 def main():
+    parser = argparse.ArgumentParser(description="Scrapes baidu search results and resolves target links.")
+    parser.add_argument("--config", metavar="FILE", default="scrape-config.yml", help="configuration file (default: scrape-config.yml)")
+    parser.add_argument("--resume", metavar="DIR", help="continue an interrupted run in its working directory")
+    parser.add_argument("--worker", action="store_true", help="take keywords, links and hosts from the shared work queue")
+    parser.add_argument("--export", action="store_true", help="write the results of the work queue to a new working directory")
+    parser.add_argument("--run", metavar="ID", help="the shared run of --worker and --export; every run has its own work queue")
+    # every stage can run on its own; selenium, aiohttp and asyncwhois are imported only by the stages that use them
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    commands.add_parser("all", help="search, resolve links and check hosts as configured (default)")
+    extract_parser = commands.add_parser("extract", help="search the keywords and save the extracted links")
+    extract_parser.add_argument("--keywords", metavar="FILE", help="keywords, one per line (default: search_list of the config)")
+    extract_parser.add_argument("--output", metavar="FILE", help="extracted links file (default: in a new working directory)")
+    resolve_parser = commands.add_parser("resolve", help="resolve the links of an extracted links file")
+    resolve_parser.add_argument("--input", metavar="FILE", required=True, help="extracted links file, in any output format")
+    resolve_parser.add_argument("--output", metavar="DIR", help="directory of the resolved links and hosts (default: in a new working directory)")
+    whois_parser = commands.add_parser("whois", help="check the hosts of a hosts file")
+    whois_parser.add_argument("--input", metavar="FILE", required=True, help="hosts, one per line, e.g. baidu_extracted_hosts.txt")
+    whois_parser.add_argument("--output", metavar="DIR", help="directory of the whois results (default: baidu_whois in list_dirs)")
+    args = parser.parse_args()
+    command = args.command or "all"
+    if command != "all" and (args.resume or args.worker or args.export):
+        parser.error("--resume, --worker and --export apply to the 'all' command only")
+    if command in ["resolve", "whois"] and not os.path.isfile(args.input):
+        parser.error(f"input file not found: '{args.input}'")
+    if (args.worker or args.export) and not args.run:
+        parser.error("--worker and --export need the --run ID of the shared run")
+
     logging.basicConfig()
 
     logger = logging.getLogger("scrape-baidu")
 
-    with open("scrape-config.yml") as fp:
+    with open(args.config) as fp:
         config = yaml.safe_load(fp)
 
     if "log_level" in config:
@@ -43,8 +73,6 @@ def main():
     else:
         logger.setLevel(logging.DEBUG)
 
-    loop = asyncio.get_event_loop()
-
     search_list = config["search_list"]  if "search_list" in config else []
     search_pages = config["search_pages"]  if "search_pages" in config else 1
     inurl = config["inurl"] if "inurl" in config else False
@@ -52,46 +80,468 @@ def main():
     indomain_filter = config["indomain_filter"] if "indomain_filter" in config else False
     resolve_links = config["resolve_links"] if "resolve_links" in config else False
     whois_hosts = config["whois_hosts"] if "whois_hosts" in config else False
+    fetch_timeout = config["fetch_timeout"] if "fetch_timeout" in config else 15
+    fetch_limit_per_host = config["fetch_limit_per_host"] if "fetch_limit_per_host" in config else 0
+    fetch_dns_cache_ttl = config["fetch_dns_cache_ttl"] if "fetch_dns_cache_ttl" in config else 300
+    fetch_keepalive_timeout = config["fetch_keepalive_timeout"] if "fetch_keepalive_timeout" in config else 30
+    link_cache = config["link_cache"] if "link_cache" in config else False
+    link_cache_ttl_days = config["link_cache_ttl_days"] if "link_cache_ttl_days" in config else 30
+    link_cache_max_entries = config["link_cache_max_entries"] if "link_cache_max_entries" in config else 1000000
+    whois_store = config["whois_store"] if "whois_store" in config else False
+    whois_csv_export = config["whois_csv_export"] if "whois_csv_export" in config else True
+    whois_not_found_ttl_days = config["whois_not_found_ttl_days"] if "whois_not_found_ttl_days" in config else 7
+    whois_failed_ttl_days = config["whois_failed_ttl_days"] if "whois_failed_ttl_days" in config else 1
+    whois_no_expires_ttl_days = config["whois_no_expires_ttl_days"] if "whois_no_expires_ttl_days" in config else 30
+    whois_server = config["whois_server"] if "whois_server" in config else None
+    public_suffix_list_path = config["public_suffix_list"] if "public_suffix_list" in config else None
+    whois_registrable_domains = config["whois_registrable_domains"] if "whois_registrable_domains" in config else public_suffix_list_path is not None
+    resolve_tasks = config["resolve_tasks"] if "resolve_tasks" in config else 6
+    whois_tasks = config["whois_tasks"] if "whois_tasks" in config else 3
+    adaptive_limits = config["adaptive_limits"] if "adaptive_limits" in config else False
+    resolve_max_tasks = config["resolve_max_tasks"] if "resolve_max_tasks" in config else 32
+    whois_max_tasks = config["whois_max_tasks"] if "whois_max_tasks" in config else 10
     proxy_list = config["proxy_list"] if "proxy_list" in config else []
+    proxy_cooldown = config["proxy_cooldown"] if "proxy_cooldown" in config else 60
+    proxy_max_cooldown = config["proxy_max_cooldown"] if "proxy_max_cooldown" in config else 900
+    resolve_via_proxy = config["resolve_via_proxy"] if "resolve_via_proxy" in config else False
+    metrics = config["metrics"] if "metrics" in config else True
+    engine = config["engine"] if "engine" in config else "browser"
+    baidu_url = config["baidu_url"] if "baidu_url" in config else "https://www.baidu.com"
     browser_timeout = config["browser_timeout"] if "browser_timeout" in config else 10
+    headless = config["headless"] if "headless" in config else False
+    browser_max_uses = config["browser_max_uses"] if "browser_max_uses" in config else 50
+    parallel_browsers = config["parallel_browsers"] if "parallel_browsers" in config else 1
+    early_stop_pages = config["early_stop_pages"] if "early_stop_pages" in config else 0
+    early_stop_min_new_links = config["early_stop_min_new_links"] if "early_stop_min_new_links" in config else 1
+    redistribute_pages = config["redistribute_pages"] if "redistribute_pages" in config else False
+    max_extra_pages = config["max_extra_pages"] if "max_extra_pages" in config else 5
+    dedupe_index = config["dedupe_index"] if "dedupe_index" in config else False
+    dedupe_error_rate = config["dedupe_error_rate"] if "dedupe_error_rate" in config else 0.001
+    dedupe_capacity = config["dedupe_capacity"] if "dedupe_capacity" in config else 1000000
+    dedupe_generation_days = config["dedupe_generation_days"] if "dedupe_generation_days" in config else 7
+    dedupe_max_age_days = config["dedupe_max_age_days"] if "dedupe_max_age_days" in config else 90
+    dedupe_max_mb = config["dedupe_max_mb"] if "dedupe_max_mb" in config else 256
+    pipeline = config["pipeline"] if "pipeline" in config else False
+    pipeline_queue_size = config["pipeline_queue_size"] if "pipeline_queue_size" in config else 1000
+    output_flush_interval = config["output_flush_interval"] if "output_flush_interval" in config else 1
+    output_fsync = config["output_fsync"] if "output_fsync" in config else False
+    output_format = config["output_format"] if "output_format" in config else "csv"
+    work_queue_location = config["work_queue"] if "work_queue" in config else None
+    work_lease_seconds = config["work_lease_seconds"] if "work_lease_seconds" in config else 600
+    work_max_attempts = config["work_max_attempts"] if "work_max_attempts" in config else 3
+    work_batch_size = config["work_batch_size"] if "work_batch_size" in config else 50
     lists_dir = config["list_dirs"] if "list_dirs" in config else os.path.join(".", "lists")
+
+    if command == "extract":
+        resolve_links = False
+        whois_hosts = False
+        if args.keywords:
+            with open(args.keywords, "r", encoding="utf8") as fp:
+                search_list = [line.strip() for line in fp if line.strip()]
+    elif command == "resolve":
+        resolve_links = True
+        whois_hosts = False
+    elif command == "whois":
+        resolve_links = False
+        whois_hosts = True
+    # whois runs on the hosts of resolved links, or on the input of the whois command
+    check_whois = whois_hosts and (resolve_links or command == "whois")
     
-    working_dir = os.path.join(lists_dir, datetime.today().strftime('%Y%m%d%H%M%S'))    
+    if args.resume and output_format == "parquet":
+        logger.error("a run with output_format 'parquet' cannot be resumed, parquet files are complete only once the run ends")
+        return
+    if args.resume:
+        # continue an interrupted run: completed keywords, links and hosts are skipped
+        working_dir = args.resume
+        if not os.path.isdir(working_dir):
+            logger.error(f"Working directory not found: '{working_dir}'")
+            return
+    else:
+        working_dir = os.path.join(lists_dir, datetime.today().strftime('%Y%m%d%H%M%S'))    
     # working_dir = os.path.join(lists_dir, "20220523165245")    
 
     baidu_links_extracted_dir = os.path.join(working_dir, "baidu_extracted_links")
     baidu_whois_dir = os.path.join(lists_dir, 'baidu_whois')
+    baidu_extracted_links_path = os.path.join(baidu_links_extracted_dir, "baidu_extracted_links.csv")
+    if command == "extract" and args.output:
+        baidu_extracted_links_path = args.output
+    elif command == "resolve" and args.output:
+        baidu_links_extracted_dir = args.output
+    elif command == "whois" and args.output:
+        baidu_whois_dir = args.output
 
-    makeDirs([working_dir, baidu_links_extracted_dir, baidu_whois_dir])
-    
-    baidu_link_list = list(extractBaiduLinks(logger, search_list, search_pages, proxy_list, {
+    # resolve and whois write only to their output directory, the run report goes there as well;
+    # they cannot be resumed, so they keep no checkpoint journal
+    if args.worker:
+        # the work queue records the progress of workers, their results are written by --export;
+        # every worker writes its run report to a directory of its own, even if started in the same second
+        report_dir = os.path.join(lists_dir, f"workers_{args.run}", f"{socket.gethostname()}-{os.getpid()}-{datetime.today().strftime('%Y%m%d%H%M%S')}")
+        makeDirs([lists_dir, baidu_whois_dir, report_dir])
+    elif command == "resolve":
+        report_dir = baidu_links_extracted_dir
+        makeDirs([lists_dir, baidu_links_extracted_dir])
+    elif command == "whois":
+        report_dir = baidu_whois_dir
+        makeDirs([lists_dir, baidu_whois_dir])
+    elif command == "extract":
+        report_dir = working_dir
+        makeDirs([lists_dir, working_dir, os.path.dirname(baidu_extracted_links_path) or "."])
+    else:
+        report_dir = working_dir
+        makeDirs([working_dir, baidu_links_extracted_dir, baidu_whois_dir])
+
+    # workers share the cache, every link is committed on its own so no worker holds the write lock
+    baidu_link_cache = LinkCache(os.path.join(lists_dir, "baidu_link_cache.sqlite"), link_cache_ttl_days*24*3600, link_cache_max_entries,
+        1 if args.worker else 100, 10000, 30 if args.worker else 5) if link_cache and resolve_links else None
+
+    # links and hosts of earlier runs are skipped
+    baidu_dedupe_index = DedupeIndex(os.path.join(lists_dir, "baidu_dedupe_index.sqlite"), {
+        "error_rate": dedupe_error_rate,
+        "capacity": dedupe_capacity,
+        "generation_days": dedupe_generation_days,
+        "max_age_days": dedupe_max_age_days,
+        "max_bytes": dedupe_max_mb*1024*1024,
+        # workers only read the index, the export adds the links and hosts of the run
+        "read_only": args.worker
+    }) if dedupe_index else None
+
+    public_suffix_list = None
+    if whois_registrable_domains:
+        public_suffix_list = PublicSuffixList.load(public_suffix_list_path) if public_suffix_list_path else PublicSuffixList()
+
+    baidu_whois_store = None
+    if check_whois and whois_store:
+        whois_store_path = os.path.join(baidu_whois_dir, "baidu_whois.sqlite")
+        new_whois_store = not os.path.exists(whois_store_path)
+        baidu_whois_store = WhoisStore(whois_store_path, {
+            "not_found_ttl": whois_not_found_ttl_days*24*3600,
+            "failed_ttl": whois_failed_ttl_days*24*3600,
+            "no_expires_ttl": whois_no_expires_ttl_days*24*3600,
+            "public_suffix_list": public_suffix_list
+        })
+        if new_whois_store and os.path.exists(os.path.join(baidu_whois_dir, "baidu_whois_not_expired.csv")):
+            baidu_whois_store.importNotExpired(os.path.join(baidu_whois_dir, "baidu_whois_not_expired.csv"))
+
+    # with adaptive limits, resolve_tasks and whois_tasks are the starting budgets per target,
+    # which grow up to *_max_tasks while requests succeed and shrink on timeouts and resets
+    resolve_limiter = None
+    whois_limiter = None
+    if adaptive_limits and resolve_links:
+        resolve_limiter = AdaptiveLimiter(logger, "resolve", {"initial_limit": resolve_tasks, "max_limit": resolve_max_tasks})
+        resolve_tasks = max(resolve_tasks, resolve_max_tasks)
+    if adaptive_limits and check_whois:
+        whois_limiter = AdaptiveLimiter(logger, "whois", {"initial_limit": whois_tasks, "max_limit": whois_max_tasks})
+        whois_tasks = max(whois_tasks, whois_max_tasks)
+
+    # search and, with resolve_via_proxy, link resolution take the healthiest proxy for every request
+    baidu_proxy_pool = ProxyPool(logger, proxy_list, {"cooldown": proxy_cooldown, "max_cooldown": proxy_max_cooldown})
+
+    # run_report.json and metrics.prom are written to report_dir at the end of the run
+    run_metrics = Metrics() if metrics else None
+
+    # pages saved by keywords that stopped early go to keywords that still find new links
+    page_budget = PageBudget(max_extra_pages) if redistribute_pages and early_stop_pages else None
+
+    def stage_timer(stage):
+        return run_metrics.time("stage_seconds", {"stage": stage}) if run_metrics is not None else nullcontext()
+
+    def log_stage(name, seconds, labels):
+        if name == "stage_seconds":
+            logger.info(f"stage '{labels['stage']}' took {seconds:.1f}s")
+
+    if run_metrics is not None:
+        run_metrics.addHook(log_stage)
+
+    # parquet rows are not on disk before the file is closed, so they cannot be journaled as done
+    checkpoint = Checkpoint(working_dir if command in ["all", "extract"] and output_format != "parquet" and not args.worker else None, {"flush_interval": output_flush_interval})
+
+    # links and hosts saved by the interrupted run
+    saved_link_list = []
+    saved_host_list = []
+    if args.resume:
+        saved_link_list = [row[:3] for row in loadBaiduLinks(baidu_extracted_links_path, output_format)]
+        saved_host_list = list(loadBaiduCheckedHosts(baidu_links_extracted_dir, output_format))
+        logger.info(f"resuming '{working_dir}': {len(checkpoint.keywords)} keywords, {len(saved_link_list)} links, "
+            f"{len(checkpoint.links)} resolved links, {len(checkpoint.hosts)} checked hosts")
+
+    # the stages share one event loop, closed at the end of the run
+    loop = asyncio.new_event_loop()
+    try:
+        extract_options = {
             "inurl": inurl,
-            "browser_timeout": browser_timeout
-        }))
-    saveBaiduLinks(baidu_link_list, os.path.join(baidu_links_extracted_dir, "baidu_extracted_links.csv"), inurl)
-    # baidu_link_list = list(loadBaiduLinks(os.path.join(baidu_links_extracted_dir, "baidu_extracted_links.csv")))
-
-    if resolve_links:
-        baidu_links_checked = list(checkBaiduLinks(logger, baidu_link_list,
-            [
-                re.compile(r"\/\/([^\.\/]+\.)?baidu\.")
-            ],
-            6, loop, {
-                "inurl_filter": inurl_filter,
-                "indomain_filter": indomain_filter
-            }))
-        saveBaiduCheckedLinks(baidu_links_checked, baidu_links_extracted_dir)
-
-        extracted_host_list = getHostsFromCheckedBaiduLinks(baidu_links_checked)
-        saveBaiduTargetHosts(extracted_host_list, os.path.join(baidu_links_extracted_dir, "baidu_extracted_hosts.txt"))
-        # host_list = list(loadBaiduTargetHosts(os.path.join(baidu_links_extracted_dir, "baidu_extracted_hosts.txt")))
-
-        if whois_hosts:
-            whois_not_expired = []    
-            whois_host_list = list(filterWhoisHosts(extracted_host_list, whois_not_expired, baidu_whois_dir))
-            whois_info_list = list(getWhoisForHosts(logger, whois_host_list, 3, loop, 10))
-            saveWhoisForHosts(logger, whois_info_list, whois_not_expired, baidu_whois_dir)
+            "engine": engine,
+            "baidu_url": baidu_url,
+            "browser_timeout": browser_timeout,
+            "headless": headless,
+            "browser_max_uses": browser_max_uses,
+            "parallel_browsers": parallel_browsers,
+            "proxy_pool": baidu_proxy_pool,
+            "metrics": run_metrics,
+            "early_stop_pages": early_stop_pages,
+            "early_stop_min_new_links": early_stop_min_new_links,
+            "page_budget": page_budget,
+            "dedupe_index": baidu_dedupe_index,
+            "baidu_link_set": set(row[0] for row in saved_link_list)
+        }
+        check_options = {
+            "inurl_filter": inurl_filter,
+            "indomain_filter": indomain_filter,
+            "fetch_timeout": fetch_timeout,
+            "limit_per_host": fetch_limit_per_host,
+            "dns_cache_ttl": fetch_dns_cache_ttl,
+            "keepalive_timeout": fetch_keepalive_timeout,
+            "link_cache": baidu_link_cache,
+            "limiter": resolve_limiter,
+            "proxy_pool": baidu_proxy_pool if resolve_via_proxy else None,
+            "metrics": run_metrics
+        }
+        whois_options = {
+            "public_suffix_list": public_suffix_list,
+            "limiter": whois_limiter,
+            "metrics": run_metrics,
+            "whois_server": whois_server
+        }
+        reject_patterns = [
+            re.compile(r"\/\/([^\.\/]+\.)?baidu\.")
+        ]
+        sink_options = {
+            "flush_interval": output_flush_interval,
+            "fsync": output_fsync,
+            "output_format": output_format,
+            "append": bool(args.resume)
+        }
+
+        search_todo_list = [search for search in search_list if not checkpoint.isKeywordDone(search)]
+
+        def open_whois_sink(whois_not_expired):
+            # with the whois store, results are upserted into it, otherwise written to the csv files right away
+            if baidu_whois_store is not None:
+                checkpoint.addSink(baidu_whois_store)
+                return None
+            whois_sink = WhoisSink(logger, baidu_whois_dir, whois_not_expired, sink_options)
+            checkpoint.addSink(whois_sink)
+            return whois_sink
+
+        def write_whois(whois_sink, whois_info):
+            if whois_sink is not None:
+                whois_sink.write(whois_info)
+            else:
+                baidu_whois_store.upsert(*whois_info)
+            checkpoint.hostChecked(whois_info[0])
+            addCheckedHost(baidu_dedupe_index, *whois_info)
+
+        def close_whois_sink(whois_sink):
+            if whois_sink is not None:
+                checkpoint.removeSink(whois_sink)
+                whois_sink.close()
+            else:
+                checkpoint.removeSink(baidu_whois_store)
+                baidu_whois_store.commit()
+                if whois_csv_export:
+                    baidu_whois_store.exportCsv(baidu_whois_dir)
+
+        def open_checked_sink():
+            checked_sink = CheckedLinksSink(baidu_links_extracted_dir, sink_options)
+            checked_sink.hosts.update(saved_host_list)
+            checkpoint.addSink(checked_sink)
+            return checked_sink
 
+        def write_checked(checked_sink, checked_link):
+            checked_sink.write(checked_link)
+            checkpoint.linkResolved(checked_link[0])
+            addDoneLink(baidu_dedupe_index, checked_link[0], checked_link[1])
+
+        def close_checked_sink(checked_sink):
+            checkpoint.removeSink(checked_sink)
+            checked_sink.close()
+            saveBaiduTargetHosts(list(checked_sink.hosts), os.path.join(baidu_links_extracted_dir, "baidu_extracted_hosts.txt"))
+
+        if args.worker or args.export:
+            # several processes, on one or more machines, share the keywords, links and hosts of a run
+            work_queue_location = work_queue_location or os.path.join(lists_dir, "work_queue_{run}.sqlite")
+            if "{run}" not in work_queue_location:
+                logger.error(f"'work_queue' must contain {{run}}, so that every run has its own queue: '{work_queue_location}'")
+                return
+            work_queue = openWorkQueue(work_queue_location.replace("{run}", args.run), {
+                "lease_seconds": work_lease_seconds,
+                "max_attempts": work_max_attempts
+            })
+            try:
+                if args.worker:
+                    # every worker adds search_list, keywords that are already queued are not added again
+                    work_queue.put("keyword", ((search, None) for search in search_list))
+                    if baidu_whois_store is not None:
+                        exclude_hosts = loadWhoisExcludeList(baidu_whois_dir)
+                    elif check_whois:
+                        exclude_hosts = loadWhoisExcludeHosts([], baidu_whois_dir, output_format)
+                    else:
+                        exclude_hosts = set()
+                    with stage_timer("worker"):
+                        runWorker(logger, work_queue, search_pages, proxy_list, reject_patterns, loop, {
+                            "extract_options": extract_options,
+                            "check_options": check_options,
+                            "whois_options": whois_options,
+                            "resolve_links": resolve_links,
+                            "resolve_tasks": resolve_tasks,
+                            "whois_hosts": whois_hosts,
+                            "whois_tasks": whois_tasks,
+                            "batch_size": work_batch_size,
+                            "exclude_hosts": exclude_hosts,
+                            "whois_store": baidu_whois_store,
+                            "dedupe_index": baidu_dedupe_index
+                        })
+                elif not work_queue.counts():
+                    logger.error(f"work queue of run '{args.run}' is empty, nothing to export")
+                else:
+                    whois_not_expired = []
+                    if check_whois and baidu_whois_store is None:
+                        loadWhoisExcludeHosts(whois_not_expired, baidu_whois_dir, output_format)
+                    links_sink = ExtractedLinksSink(baidu_extracted_links_path, inurl, sink_options)
+                    checked_sink = open_checked_sink() if resolve_links else None
+                    whois_sink = open_whois_sink(whois_not_expired) if check_whois else None
+                    def write_link(baidu_link):
+                        links_sink.write(baidu_link)
+                        # resolved links are added by write_checked
+                        if not resolve_links:
+                            addDoneLink(baidu_dedupe_index, baidu_link[0])
+                    try:
+                        exportWorkQueue(work_queue, write_link,
+                            (lambda checked_link: write_checked(checked_sink, checked_link)) if checked_sink is not None else None,
+                            (lambda whois_info: write_whois(whois_sink, whois_info)) if check_whois else None)
+                    finally:
+                        links_sink.close()
+                        if checked_sink is not None:
+                            close_checked_sink(checked_sink)
+                        if check_whois:
+                            close_whois_sink(whois_sink)
+                logger.info(f"work queue: {work_queue.counts()}")
+            finally:
+                work_queue.close()
+            return
+
+        if pipeline and command == "all":
+            # links are resolved while search is still running, new hosts go to whois as soon as they are found
+            whois_not_expired = []
+            if baidu_whois_store is not None:
+                exclude_hosts = loadWhoisExcludeList(baidu_whois_dir)
+            elif check_whois:
+                exclude_hosts = loadWhoisExcludeHosts(whois_not_expired, baidu_whois_dir, output_format)
+            else:
+                exclude_hosts = set()
+            links_sink = ExtractedLinksSink(baidu_extracted_links_path, inurl, sink_options)
+            checkpoint.addSink(links_sink)
+            checked_sink = open_checked_sink() if resolve_links else None
+            whois_sink = open_whois_sink(whois_not_expired) if check_whois else None
+            try:
+                runPipeline(logger, search_todo_list, search_pages, proxy_list, reject_patterns, loop, {
+                        **check_options,
+                        "extract_options": extract_options,
+                        "resolve_links": resolve_links,
+                        "resolve_tasks": resolve_tasks,
+                        "whois_hosts": check_whois,
+                        "whois_tasks": whois_tasks,
+                        "whois_timeout": 10,
+                        "queue_size": pipeline_queue_size,
+                        "whois_store": baidu_whois_store,
+                        "public_suffix_list": public_suffix_list,
+                        "resolve_limiter": resolve_limiter,
+                        "whois_limiter": whois_limiter,
+                        "whois_server": whois_server,
+                        "dedupe_index": baidu_dedupe_index,
+                        "checkpoint": checkpoint,
+                        "pending_links": saved_link_list,
+                        "pending_hosts": saved_host_list
+                    }, exclude_hosts, links_sink.write,
+                    (lambda checked_link: checked_sink.write(checked_link)) if checked_sink is not None else None,
+                    (lambda whois_info: whois_sink.write(whois_info) if whois_sink is not None else baidu_whois_store.upsert(*whois_info)) if check_whois else None)
+            finally:
+                checkpoint.removeSink(links_sink)
+                links_sink.close()
+                if checked_sink is not None:
+                    close_checked_sink(checked_sink)
+                if check_whois:
+                    close_whois_sink(whois_sink)
+            return
+
+        baidu_link_list = list(saved_link_list)
+        if command == "resolve":
+            # the input is read as it is named, in the format of its extension (csv for other names)
+            baidu_link_list = [row[:3] for row in loadBaiduLinks(args.input, recordFormat(args.input))]
+        elif command != "whois":
+            with stage_timer("extract"):
+                with ExtractedLinksSink(baidu_extracted_links_path, inurl, sink_options) as links_sink:
+                    checkpoint.addSink(links_sink)
+                    try:
+                        for baidu_link in extractBaiduLinks(logger, search_todo_list, search_pages, proxy_list, {
+                                **extract_options,
+                                "on_keyword_done": checkpoint.keywordDone
+                            }):
+                            links_sink.write(baidu_link)
+                            baidu_link_list.append(baidu_link)
+                            if not resolve_links:
+                                addDoneLink(baidu_dedupe_index, baidu_link[0])
+                    finally:
+                        checkpoint.removeSink(links_sink)
+        # baidu_link_list = list(loadBaiduLinks(os.path.join(baidu_links_extracted_dir, "baidu_extracted_links.csv")))
+
+        if command == "whois":
+            extracted_host_list = [host for host in loadBaiduTargetHosts(args.input) if host]
+        elif resolve_links:
+            with stage_timer("resolve"):
+                checked_sink = open_checked_sink()
+                try:
+                    for checked_link in checkBaiduLinks(logger, (row for row in baidu_link_list if not checkpoint.isLinkResolved(row[0])), reject_patterns, resolve_tasks, loop, check_options):
+                        write_checked(checked_sink, checked_link)
+                finally:
+                    close_checked_sink(checked_sink)
+
+            extracted_host_list = list(checked_sink.hosts)
+            # host_list = list(loadBaiduTargetHosts(os.path.join(baidu_links_extracted_dir, "baidu_extracted_hosts.txt")))
+
+        if check_whois:
+            whois_not_expired = []    
+            extracted_host_list = [host for host in extracted_host_list if not checkpoint.isHostChecked(host)
+                and (baidu_dedupe_index is None or "host:" + host not in baidu_dedupe_index)]
+            if baidu_whois_store is not None:
+                exclude_hosts = loadWhoisExcludeList(baidu_whois_dir)
+                whois_host_list = list(baidu_whois_store.filterHosts(host for host in extracted_host_list if host not in exclude_hosts))
+            else:
+                whois_host_list = list(filterWhoisHosts(extracted_host_list, whois_not_expired, baidu_whois_dir, output_format))
+            with stage_timer("whois"):
+                whois_sink = open_whois_sink(whois_not_expired)
+                try:
+                    for whois_info in getWhoisForHosts(logger, whois_host_list, whois_tasks, loop, 10, whois_options):
+                        write_whois(whois_sink, whois_info)
+                finally:
+                    close_whois_sink(whois_sink)
+    finally:
+        loop.close()
+        checkpoint.close()
+        report = {}
+        if baidu_link_cache is not None:
+            stats = baidu_link_cache.stats()
+            logger.info(f"link cache hits: {stats['hits']}, misses: {stats['misses']}, errors: {stats['errors']}")
+            report["link_cache"] = stats
+            baidu_link_cache.close()
+        if baidu_whois_store is not None:
+            baidu_whois_store.close()
+        if baidu_dedupe_index is not None:
+            stats = baidu_dedupe_index.stats()
+            logger.info(f"dedupe index: {stats['hits']} seen before, {stats['added']} added, {stats['keys']} keys in {stats['bytes']/1024/1024:.1f} MB")
+            report["dedupe_index"] = stats
+            baidu_dedupe_index.close()
+        if len(baidu_proxy_pool):
+            logger.info(baidu_proxy_pool.report())
+        for limiter in [resolve_limiter, whois_limiter]:
+            if limiter is not None:
+                logger.info(limiter.report())
+        if page_budget is not None:
+            logger.info(f"page budget: {page_budget.given} extra pages given, {page_budget.saved} left")
+        if run_metrics is not None:
+            report["proxies"] = baidu_proxy_pool.stats()
+            report["limits"] = {limiter.name: limiter.stats() for limiter in [resolve_limiter, whois_limiter] if limiter is not None}
+            run_metrics.saveJson(os.path.join(report_dir, "run_report.json"), report)
+            run_metrics.savePrometheus(os.path.join(report_dir, "metrics.prom"))
 
     # input("Press Enter to continue...")
 
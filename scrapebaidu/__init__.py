@@ -10,7 +10,53 @@ __all__ = (
     "saveBaiduTargetHosts",
     "filterWhoisHosts",
     "getWhoisForHosts",
-    "saveWhoisForHosts"
+    "aioCheckBaiduLinks",
+    "aioGetWhoisForHosts",
+    "saveWhoisForHosts",
+    "BrowserPool",
+    "getChromeDriverPath",
+    "aioExtractSearchBaiduLinksHttp",
+    "loadWhoisExcludeHosts",
+    "addDoneLink",
+    "addCheckedHost",
+    "runPipeline",
+    "aioRunPipeline",
+    "LinkCache",
+    "loadWhoisExcludeList",
+    "WhoisStore",
+    "CheckedLinksSink",
+    "WhoisSink",
+    "ExtractedLinksSink",
+    "Checkpoint",
+    "loadBaiduCheckedHosts",
+    "PublicSuffixList",
+    "AdaptiveLimiter",
+    "ProxyPool",
+    "Metrics",
+    "PageBudget",
+    "DedupeIndex",
+    "loadRecords",
+    "recordFormat",
+    "SqliteWorkQueue",
+    "openWorkQueue",
+    "runWorker",
+    "exportWorkQueue"
 )
 
 from .utils import *
+from .browserpool import BrowserPool, getChromeDriverPath
+from .httpserp import aioExtractSearchBaiduLinksHttp
+from .pipeline import runPipeline, aioRunPipeline
+from .linkcache import LinkCache
+from .whoisstore import WhoisStore
+from .sinks import CheckedLinksSink, WhoisSink, ExtractedLinksSink, loadRecords
+from .checkpoint import Checkpoint
+from .domains import PublicSuffixList
+from .ratelimit import AdaptiveLimiter
+from .proxypool import ProxyPool
+from .metrics import Metrics
+from .pagedepth import PageBudget
+from .dedupeindex import DedupeIndex
+from .workqueue import SqliteWorkQueue, openWorkQueue
+from .worker import runWorker, exportWorkQueue
+from .records import recordFormat
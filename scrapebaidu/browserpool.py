@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+
+# selenium and webdriver_manager are imported when the first browser is created
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from logging import Logger
+import threading
+import time
+from .metrics import Metrics
+if TYPE_CHECKING:
+    from selenium.webdriver.chrome.webdriver import WebDriver
+
+_chrome_driver_path = None
+_chrome_driver_lock = threading.Lock()
+
+def getChromeDriverPath() -> str:
+    # ChromeDriverManager().install() checks the installed driver version every time,
+    # so the path is resolved only once per process
+    global _chrome_driver_path
+    with _chrome_driver_lock:
+        if _chrome_driver_path is None:
+            from webdriver_manager.chrome import ChromeDriverManager
+            _chrome_driver_path = ChromeDriverManager().install()
+        return _chrome_driver_path
+
+def createChromeBrowser(proxy: str = '', options: dict = []) -> WebDriver:
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    headless: bool = options["headless"] if "headless" in options else False
+
+    chrome_options = webdriver.ChromeOptions()
+
+    if headless:
+        chrome_options.add_argument('--headless')
+    if proxy:
+        chrome_options.add_argument(f"--proxy-server={proxy}")
+
+    chrome_options.add_experimental_option("prefs", {"profile. Managed_default_content_settings. Images": 2})
+    chrome_options.add_experimental_option('excludeSwitches', ['enable automation '])
+
+    return webdriver.Chrome(service=Service(getChromeDriverPath()), options=chrome_options)
+
+class BrowserSession:
+    def __init__(self, proxy: str = ''):
+        self.proxy = proxy
+        self.browser: WebDriver = None
+        self.uses = 0
+
+class BrowserPool:
+    def __init__(self, logger: Logger, size: int, proxy_list: list[str] = [], options: dict = []):
+        self.logger = logger
+        self.size = max(1, size)
+        self.headless: bool = options["headless"] if "headless" in options else False
+        self.max_uses: int = options["max_uses"] if "max_uses" in options else 50
+        self.metrics: Metrics = options["metrics"] if "metrics" in options else None
+        self.sessions: list[BrowserSession] = []
+        self.idle: list[BrowserSession] = []
+        self.launched = 0
+        self.launch_seconds = 0.0
+        self.recycled = 0
+        self.closed = False
+        self.lock = threading.Condition()
+        proxies = list(proxy_list) or ['']
+        for i in range(self.size):
+            session = BrowserSession(proxies[i % len(proxies)])
+            self.sessions.append(session)
+            self.idle.append(session)
+
+    def launch(self, session: BrowserSession):
+        started = time.monotonic()
+        session.browser = createChromeBrowser(session.proxy, {"headless": self.headless})
+        session.uses = 0
+        elapsed = time.monotonic() - started
+        with self.lock:
+            self.launched += 1
+            self.launch_seconds += elapsed
+        if self.metrics is not None:
+            self.metrics.observe("browser_launch_seconds", elapsed)
+        self.logger.debug(f"browser launched in {elapsed:.2f}s, proxy: '{session.proxy}'")
+
+    def recycle(self, session: BrowserSession):
+        if session.browser is not None:
+            try:
+                session.browser.quit()
+            except Exception as e:
+                self.logger.debug(f"failed to quit browser: {type(e).__name__}: {e}")
+            session.browser = None
+            with self.lock:
+                self.recycled += 1
+
+    def reset(self, session: BrowserSession):
+        browser = session.browser
+        handles = browser.window_handles
+        for handle in handles[1:]:
+            browser.switch_to.window(handle)
+            browser.close()
+        browser.switch_to.window(handles[0])
+        browser.delete_all_cookies()
+        browser.get('about:blank')
+
+    def warmUp(self):
+        for session in self.sessions:
+            if session.browser is None:
+                self.launch(session)
+
+    def lease(self, proxy: str = None) -> BrowserSession:
+        with self.lock:
+            while not self.idle:
+                self.lock.wait()
+            session = None
+            if proxy is not None:
+                session = next((s for s in self.idle if s.proxy == proxy), None)
+            if session is None:
+                session = next((s for s in self.idle if s.browser is not None), self.idle[0])
+            self.idle.remove(session)
+        if proxy is not None and session.proxy != proxy:
+            # the session is bound to another proxy, relaunch it with the requested one
+            self.recycle(session)
+            session.proxy = proxy
+        try:
+            if session.browser is None:
+                self.launch(session)
+        except Exception:
+            self.release(session, True)
+            raise
+        session.uses += 1
+        return session
+
+    def release(self, session: BrowserSession, failed: bool = False):
+        if session.browser is not None:
+            if failed or self.closed or session.uses >= self.max_uses:
+                self.recycle(session)
+            else:
+                try:
+                    self.reset(session)
+                except Exception as e:
+                    self.logger.debug(f"failed to reset browser: {type(e).__name__}: {e}")
+                    self.recycle(session)
+        with self.lock:
+            self.idle.append(session)
+            self.lock.notify()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            idle = list(self.idle)
+        # sessions that are still leased are recycled on release
+        for session in idle:
+            self.recycle(session)
+
+    def stats(self) -> dict:
+        return {
+            "launched": self.launched,
+            "launch_seconds": self.launch_seconds,
+            "recycled": self.recycled
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
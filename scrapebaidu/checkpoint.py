@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+
+import json
+import os
+import time
+import threading
+
+class Checkpoint:
+    # journal of completed work in working_dir/checkpoint.jsonl:
+    # scraped keywords, resolved links and whois-checked hosts. Resume works per keyword:
+    # a keyword that was interrupted is searched again from its first page.
+    # Records are written after the output files they depend on have been flushed,
+    # so everything in the journal is also in the output files.
+    # Without working_dir nothing is journaled, completed work is only kept in memory.
+    def __init__(self, working_dir: str, options: dict = []):
+        self.flush_interval: float = options["flush_interval"] if "flush_interval" in options else 1.0
+        self.filepath = os.path.join(working_dir, "checkpoint.jsonl") if working_dir is not None else None
+        self.keywords = set()
+        self.links = set()
+        self.hosts = set()
+        self.sinks = []
+        self.pending = []
+        self.lock = threading.RLock()
+        if self.filepath is not None and os.path.exists(self.filepath):
+            self.load()
+        self.fp = open(self.filepath, "a") if self.filepath is not None else None
+        self.flushed_at = time.monotonic()
+
+    def load(self):
+        with open(self.filepath, "r") as fp:
+            for line in fp:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the last line may be cut off by a crash
+                    continue
+                self.apply(record)
+
+    def apply(self, record: dict):
+        if "keyword" in record:
+            self.keywords.add(record["keyword"])
+        elif "link" in record:
+            self.links.add(record["link"])
+        elif "host" in record:
+            self.hosts.add(record["host"])
+
+    def addSink(self, sink):
+        # sink.flush() is called before journal records are written
+        if self.fp is not None and not getattr(sink, "flushable", True):
+            raise ValueError(f"{type(sink).__name__} in {sink.output_format} cannot be checkpointed, its rows are written only on close")
+        with self.lock:
+            self.sinks.append(sink)
+
+    def removeSink(self, sink):
+        with self.lock:
+            self.flush()
+            self.sinks.remove(sink)
+
+    def record(self, record: dict):
+        with self.lock:
+            self.apply(record)
+            self.pending.append(record)
+            if time.monotonic() - self.flushed_at >= self.flush_interval:
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            for sink in self.sinks:
+                sink.flush()
+            if self.fp is not None:
+                for record in self.pending:
+                    self.fp.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self.fp.flush()
+                os.fsync(self.fp.fileno())
+            self.pending = []
+            self.flushed_at = time.monotonic()
+
+    def keywordDone(self, search: str):
+        self.record({"keyword": search})
+
+    def linkResolved(self, link: str):
+        self.record({"link": link})
+
+    def hostChecked(self, host: str):
+        self.record({"host": host})
+
+    def isKeywordDone(self, search: str) -> bool:
+        return search in self.keywords
+
+    def isLinkResolved(self, link: str) -> bool:
+        return link in self.links
+
+    def isHostChecked(self, host: str) -> bool:
+        return host in self.hosts
+
+    def close(self):
+        with self.lock:
+            if self.fp is not None:
+                self.flush()
+                self.fp.close()
+                self.fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
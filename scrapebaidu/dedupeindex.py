@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+
+from collections.abc import Iterable
+import sqlite3
+import threading
+import hashlib
+import math
+import time
+
+def keyHashes(key: str) -> tuple[int, int]:
+    # two 64-bit hashes, the bit positions of every filter are derived from them (double hashing)
+    digest = hashlib.blake2b(key.encode('utf8'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float, bits: bytearray = None, count: int = 0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+        self.count = count
+        self.dirty = bits is None
+
+    def positions(self, hashes: tuple[int, int]) -> Iterable[int]:
+        h1, h2 = hashes
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def contains(self, hashes: tuple[int, int]) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self.positions(hashes))
+
+    def add(self, hashes: tuple[int, int]):
+        for pos in self.positions(hashes):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+        self.dirty = True
+
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+class Generation:
+    # a scalable Bloom filter: once a filter is full, a twice larger one with half the error rate is added,
+    # so the error rate of the generation stays below error_rate however many keys it gets
+    def __init__(self, created: float, capacity: int, error_rate: float):
+        self.created = created
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.filters: list[BloomFilter] = []
+
+    def sliceFilter(self, i: int, bits: bytearray = None, count: int = 0) -> BloomFilter:
+        return BloomFilter(self.capacity * 2 ** i, self.error_rate / 2 ** (i + 1), bits, count)
+
+    def contains(self, hashes: tuple[int, int]) -> bool:
+        return any(bloom_filter.contains(hashes) for bloom_filter in self.filters)
+
+    def add(self, hashes: tuple[int, int]):
+        if not self.filters or self.filters[-1].full():
+            self.filters.append(self.sliceFilter(len(self.filters)))
+        self.filters[-1].add(hashes)
+
+    def bytes(self) -> int:
+        return sum(len(bloom_filter.bits) for bloom_filter in self.filters)
+
+class DedupeIndex:
+    # links and hosts seen by earlier runs, kept in Bloom filters: a key that was added is always found,
+    # a key that was not added is found with a probability of about error_rate.
+    # Keys are added to the current generation, a new generation is started every generation_days
+    # or once the current one takes half of max_bytes; generations older than max_age_days (0 - never)
+    # are dropped, and so are the oldest ones while all filters take more than max_bytes.
+    def __init__(self, filepath: str, options: dict = []):
+        self.error_rate: float = options["error_rate"] if "error_rate" in options else 0.001
+        self.capacity: int = options["capacity"] if "capacity" in options else 1000000
+        self.generation_days: float = options["generation_days"] if "generation_days" in options else 7
+        self.max_age_days: float = options["max_age_days"] if "max_age_days" in options else 90
+        self.max_bytes: int = options["max_bytes"] if "max_bytes" in options else 256*1024*1024
+        # the filters are saved as a whole, so only one process may add keys; the others open the index read-only
+        self.read_only: bool = options["read_only"] if "read_only" in options else False
+        # the filters that changed are saved every save_keys added keys or save_interval seconds,
+        # so a run that crashes loses only the keys added since
+        self.save_keys: int = options["save_keys"] if "save_keys" in options else 1000
+        self.save_interval: float = options["save_interval"] if "save_interval" in options else 60
+        self.unsaved = 0
+        self.saved_at = time.monotonic()
+        # every generation may give a false positive, they share the error rate
+        generation_count = math.ceil(self.max_age_days / self.generation_days) + 1 if self.max_age_days else 1
+        self.generation_error_rate = self.error_rate / generation_count
+        self.generations: list[Generation] = []
+        self.hits = 0
+        self.added = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(filepath, check_same_thread=False)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS dedupe_filters (
+            created REAL NOT NULL,
+            slice INTEGER NOT NULL,
+            capacity INTEGER NOT NULL,
+            error_rate REAL NOT NULL,
+            count INTEGER NOT NULL,
+            bits BLOB NOT NULL,
+            PRIMARY KEY (created, slice)
+        )""")
+        self.db.commit()
+        self.load()
+        if not self.read_only:
+            self.expire()
+
+    def load(self):
+        generations = {}
+        for created, i, capacity, error_rate, count, bits in self.db.execute(
+                "SELECT created, slice, capacity, error_rate, count, bits FROM dedupe_filters ORDER BY created, slice"):
+            generation = generations.get(created)
+            if generation is None:
+                generation = generations[created] = Generation(created, capacity, error_rate)
+            generation.filters.append(generation.sliceFilter(i, bytearray(bits), count))
+        self.generations = list(generations.values())
+
+    def expire(self):
+        now = time.time()
+        dropped = []
+        if self.max_age_days:
+            while self.generations and self.generations[0].created + self.max_age_days*24*3600 < now:
+                dropped.append(self.generations.pop(0))
+        while len(self.generations) > 1 and sum(generation.bytes() for generation in self.generations) > self.max_bytes:
+            dropped.append(self.generations.pop(0))
+        for generation in dropped:
+            self.db.execute("DELETE FROM dedupe_filters WHERE created = ?", (generation.created,))
+        if dropped:
+            self.db.commit()
+
+    def current(self) -> Generation:
+        now = time.time()
+        if (not self.generations or (self.max_age_days and self.generations[-1].created + self.generation_days*24*3600 < now)
+                or self.generations[-1].bytes() >= self.max_bytes // 2):
+            self.generations.append(Generation(now, self.capacity, self.generation_error_rate))
+            self.expire()
+        return self.generations[-1]
+
+    def __contains__(self, key: str) -> bool:
+        hashes = keyHashes(key)
+        with self.lock:
+            return any(generation.contains(hashes) for generation in self.generations)
+
+    def seen(self, key: str) -> bool:
+        # a lookup that counts as a hit, like add() of a known key
+        hashes = keyHashes(key)
+        with self.lock:
+            if any(generation.contains(hashes) for generation in self.generations):
+                self.hits += 1
+                return True
+            return False
+
+    def keepsUntil(self) -> float:
+        # a key added now is forgotten by this time at the latest; None if keys are never forgotten by age
+        return time.time() + self.max_age_days*24*3600 if self.max_age_days else None
+
+    def add(self, key: str) -> bool:
+        # True if the key is new
+        hashes = keyHashes(key)
+        with self.lock:
+            if any(generation.contains(hashes) for generation in self.generations):
+                self.hits += 1
+                return False
+            if self.read_only:
+                return True
+            self.current().add(hashes)
+            self.added += 1
+            self.unsaved += 1
+            save = self.unsaved >= self.save_keys or time.monotonic() - self.saved_at >= self.save_interval
+        if save:
+            self.save()
+        return True
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "added": self.added,
+                "generations": len(self.generations),
+                "keys": sum(bloom_filter.count for generation in self.generations for bloom_filter in generation.filters),
+                "bytes": sum(generation.bytes() for generation in self.generations)
+            }
+
+    def save(self):
+        # only filters that changed are written again
+        with self.lock:
+            for generation in self.generations:
+                for i, bloom_filter in enumerate(generation.filters):
+                    if bloom_filter.dirty:
+                        self.db.execute("INSERT OR REPLACE INTO dedupe_filters (created, slice, capacity, error_rate, count, bits) VALUES (?, ?, ?, ?, ?, ?)",
+                            (generation.created, i, generation.capacity, generation.error_rate, bloom_filter.count, bytes(bloom_filter.bits)))
+                        bloom_filter.dirty = False
+            self.db.commit()
+            self.unsaved = 0
+            self.saved_at = time.monotonic()
+
+    def close(self):
+        if not self.read_only:
+            self.save()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
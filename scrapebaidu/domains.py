@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+
+import ipaddress
+
+# used when no public suffix list file is configured: the default "*" rule
+# plus the multi-label suffixes that are common in baidu results;
+# the full list is https://publicsuffix.org/list/public_suffix_list.dat
+DEFAULT_PUBLIC_SUFFIXES = """
+cn
+com.cn
+net.cn
+org.cn
+gov.cn
+edu.cn
+ac.cn
+mil.cn
+xn--55qx5d.cn
+xn--io0a7i.cn
+xn--od0alg.cn
+ah.cn
+bj.cn
+cq.cn
+fj.cn
+gd.cn
+gs.cn
+gx.cn
+gz.cn
+ha.cn
+hb.cn
+he.cn
+hi.cn
+hk.cn
+hl.cn
+hn.cn
+jl.cn
+js.cn
+jx.cn
+ln.cn
+nm.cn
+nx.cn
+qh.cn
+sc.cn
+sd.cn
+sh.cn
+sn.cn
+sx.cn
+tj.cn
+tw.cn
+xj.cn
+xz.cn
+yn.cn
+zj.cn
+com.hk
+net.hk
+org.hk
+edu.hk
+gov.hk
+com.tw
+net.tw
+org.tw
+edu.tw
+gov.tw
+com.mo
+net.mo
+org.mo
+com.sg
+net.sg
+org.sg
+edu.sg
+gov.sg
+com.my
+net.my
+org.my
+co.jp
+ne.jp
+or.jp
+ac.jp
+go.jp
+co.kr
+or.kr
+ac.kr
+go.kr
+co.uk
+org.uk
+me.uk
+ac.uk
+gov.uk
+com.au
+net.au
+org.au
+edu.au
+gov.au
+co.nz
+net.nz
+org.nz
+com.br
+net.br
+org.br
+com.ru
+net.ru
+org.ru
+co.in
+net.in
+org.in
+co.za
+com.tr
+com.vn
+com.ph
+co.th
+co.id
+github.io
+blogspot.com
+"""
+
+class PublicSuffixList:
+    def __init__(self, rules: str = DEFAULT_PUBLIC_SUFFIXES):
+        self.rules = set()
+        self.wildcards = set()
+        self.exceptions = set()
+        for line in rules.splitlines():
+            rule = line.strip().split(' ')[0].lower()
+            if not rule or rule.startswith('//'):
+                continue
+            if rule.startswith('!'):
+                self.exceptions.add(rule[1:])
+            elif rule.startswith('*.'):
+                self.wildcards.add(rule[2:])
+            else:
+                self.rules.add(rule)
+
+    @classmethod
+    def load(cls, filepath: str):
+        with open(filepath, "r", encoding="utf8") as fp:
+            return cls(fp.read())
+
+    def publicSuffixLength(self, labels: list[str]) -> int:
+        # number of labels in the longest matching rule, 0 if only the default rule "*" matches
+        for i in range(len(labels)):
+            suffix = '.'.join(labels[i:])
+            if suffix in self.exceptions:
+                return len(labels) - i - 1
+            if suffix in self.rules:
+                return len(labels) - i
+            if i + 1 < len(labels) and '.'.join(labels[i+1:]) in self.wildcards:
+                return len(labels) - i
+        return 0
+
+    def registrableDomain(self, host: str) -> str:
+        # eTLD+1 of a host or netloc: "a.b.example.com.cn:8080" -> "example.com.cn";
+        # IP addresses and public suffixes are returned as they are
+        host = host.rsplit('@', 1)[-1].strip().lower()
+        if host.startswith('['):
+            return host[1:].split(']', 1)[0]
+        host = host.split(':', 1)[0].rstrip('.')
+        try:
+            ipaddress.ip_address(host)
+            return host
+        except ValueError:
+            pass
+        labels = host.split('.')
+        suffix_length = self.publicSuffixLength(labels)
+        if suffix_length == 0:
+            # a ccTLD missing from the list may have second-level suffixes (com.mx, co.il),
+            # so its hosts with two or more labels under it are returned as they are
+            if len(labels[-1]) == 2 and len(labels) > 2:
+                return host
+            suffix_length = 1
+        if suffix_length >= len(labels):
+            return host
+        return '.'.join(labels[-suffix_length-1:])
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+
+# aiohttp and lxml are imported when the http engine is used
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from logging import Logger
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit, quote
+from collections.abc import AsyncIterator
+import asyncio
+import time
+from .proxypool import ProxyPool
+from .metrics import Metrics
+from .pagedepth import PageDepth
+if TYPE_CHECKING:
+    from aiohttp import ClientSession
+
+BAIDU_URL = 'https://www.baidu.com'
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/102.0.0.0 Safari/537.36'
+
+class AnchorParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.hrefs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            for name, value in attrs:
+                if name == 'href' and value:
+                    self.hrefs.append(value)
+
+_lxml_html = None
+
+def lxmlHtml():
+    # lxml.html if lxml is installed, False otherwise; looked up once
+    global _lxml_html
+    if _lxml_html is None:
+        try:
+            import lxml.html
+            _lxml_html = lxml.html
+        except ImportError:
+            _lxml_html = False
+    return _lxml_html
+
+def parseHrefs(html: str, base_url: str = BAIDU_URL + '/s') -> list[str]:
+    lxml_html = lxmlHtml()
+    if lxml_html:
+        hrefs = lxml_html.fromstring(html).xpath('//a/@href') if html.strip() else []
+    else:
+        parser = AnchorParser()
+        parser.feed(html)
+        parser.close()
+        hrefs = parser.hrefs
+    # relative pagination links are resolved against www.baidu.com, so that
+    # url_link_re and page_link_re match them the same way as in a browser
+    return [urljoin(base_url, href) for href in hrefs]
+
+def createSerpSession(options: dict = []) -> ClientSession:
+    timeout_seconds: int = options["browser_timeout"] if "browser_timeout" in options else 10
+    user_agent: str = options["user_agent"] if "user_agent" in options else DEFAULT_USER_AGENT
+    limit_per_host: int = options["limit_per_host"] if "limit_per_host" in options else 4
+    from aiohttp import ClientSession, ClientTimeout, TCPConnector
+    return ClientSession(
+        connector=TCPConnector(limit_per_host=limit_per_host),
+        timeout=ClientTimeout(total=None, sock_connect=timeout_seconds, sock_read=timeout_seconds),
+        headers={
+            "User-Agent": user_agent,
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8"
+        })
+
+class CaptchaError(Exception):
+    pass
+
+def isBaiduCaptchaUrl(url: str, baidu_url: str = BAIDU_URL) -> bool:
+    # Baidu's verification pages: verify.baidu.com, wappass.baidu.com/static/captcha/... or a /verify path;
+    # the host of baidu_url counts as a Baidu host as well. "captcha" elsewhere in a URL
+    # (a query string, a page of another site) is not a captcha
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    if host != "baidu.com" and not host.endswith(".baidu.com") and host != (urlsplit(baidu_url).hostname or '').lower():
+        return False
+    path = parts.path.lower()
+    return host == "verify.baidu.com" or "/captcha" in path or path.startswith("/verify")
+
+async def fetchSerpPage(logger: Logger, session: ClientSession, url: str, proxy: str = '') -> str:
+    async with session.get(url, proxy=f"http://{proxy}" if proxy else None) as response:
+        if isBaiduCaptchaUrl(str(response.url), url):
+            raise CaptchaError(f"captcha page for '{url}': '{response.url}'")
+        if response.status != 200:
+            logger.warning(f"failed to load '{url}', status: {response.status}")
+            return None
+        return await response.text(errors='replace')
+
+async def aioExtractSearchBaiduLinksHttp(logger: Logger, search: str, max_pages: int, session: ClientSession, proxy: str = '', extract_options: dict = []) -> AsyncIterator[tuple[str, str]]:
+    # imported here, because utils imports this module
+    from .utils import parseLinks
+    from aiohttp import ClientError
+
+    baidu_url: str = extract_options["baidu_url"] if "baidu_url" in extract_options else BAIDU_URL
+    # the proxy came from proxy_pool, how it did is reported back when the search ends
+    proxy_pool: ProxyPool = extract_options["proxy_pool"] if "proxy_pool" in extract_options else None
+    metrics: Metrics = extract_options["metrics"] if "metrics" in extract_options else None
+    baidu_link_set: set[str] = extract_options["baidu_link_set"] if "baidu_link_set" in extract_options else set()
+    page_depth = PageDepth(baidu_link_set, max_pages, extract_options)
+
+    page_links = []
+
+    pn = ''
+
+    url = baidu_url + '/s?wd=' + quote(search)
+
+    current_page = 0
+
+    pages_ready = 0
+    links_found = 0
+    latency = 0.0
+    failure = None
+    captcha = False
+    finished = False
+
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                html = await fetchSerpPage(logger, session, url, proxy)
+            except CaptchaError as e:
+                logger.warning(str(e))
+                captcha = True
+                if metrics is not None:
+                    metrics.inc("baidu_captchas_total", {"engine": "http"})
+                break
+            except (asyncio.TimeoutError, OSError) as e:
+                logger.warning(f"failed to load page {current_page+1} for '{search}': {type(e).__name__}: {e}")
+                failure = f"{type(e).__name__}: {e}"
+                html = None
+                if metrics is not None:
+                    metrics.inc("baidu_page_timeouts_total", {"engine": "http"})
+            except ClientError as e:
+                # dropped connections, proxy and payload errors fail the page, and count against the proxy
+                logger.warning(f"failed to load page {current_page+1} for '{search}': {type(e).__name__}: {e}")
+                failure = f"{type(e).__name__}: {e}"
+                html = None
+                if metrics is not None:
+                    metrics.inc("baidu_page_errors_total", {"engine": "http"})
+            if html is not None:
+                logger.debug(f"Page {current_page+1} is ready!")
+                page_latency = time.monotonic() - started
+                pages_ready += 1
+                latency += page_latency
+                if metrics is not None:
+                    metrics.inc("baidu_pages_loaded_total", {"engine": "http"})
+                    metrics.observe("baidu_page_load_seconds", page_latency, {"engine": "http"})
+                url_links = []
+                next_pn = parseLinks(logger, parseHrefs(html), pn, url_links, page_links)
+                if not url_links and not page_links:
+                    logger.debug(f"'{search}' not found!")
+                    if metrics is not None:
+                        metrics.inc("baidu_not_found_total", {"engine": "http"})
+                links_found += len(url_links)
+                page_depth.addPage(url_links)
+                for link in url_links:
+                    yield (link, pn)
+                pn = next_pn
+
+            if current_page >= len(page_links):
+                break
+            current_page += 1
+            if not page_depth.nextPage(current_page):
+                if page_depth.stopped:
+                    logger.info(f"no new links on the last {page_depth.stale} pages of '{search}', stopped after {current_page} pages")
+                    if metrics is not None:
+                        metrics.inc("baidu_early_stops_total", {"engine": "http"})
+                break
+            # page links always point to www.baidu.com, follow them on the configured baidu_url
+            url = baidu_url + page_links[current_page-1][len(BAIDU_URL):]
+        finished = True
+    finally:
+        if proxy_pool is not None:
+            if captcha:
+                proxy_pool.captcha(proxy)
+            elif links_found:
+                proxy_pool.success(proxy, latency / pages_ready)
+            elif not finished:
+                proxy_pool.release(proxy)
+            elif pages_ready:
+                proxy_pool.empty(proxy, latency / pages_ready)
+            else:
+                proxy_pool.failure(proxy, failure or "no pages")
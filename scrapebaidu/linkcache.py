@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+
+import sqlite3
+import time
+from urllib.parse import urlparse
+
+class LinkCache:
+    # redirects of baidu links, kept between runs;
+    # filters (reject patterns, inurl/indomain) are applied to cached redirects again on every run.
+    # Processes that share the cache should commit every change (commit_interval=1), so no write
+    # transaction is held between links; a cache that stays locked for busy_timeout seconds is a cache miss
+    def __init__(self, filepath: str, ttl: float = 30*24*3600, max_entries: int = 1000000, commit_interval: int = 100, evict_interval: int = 10000, busy_timeout: float = 5):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.commit_interval = commit_interval
+        self.evict_interval = evict_interval
+        self.puts = 0
+        self.hits = 0
+        self.misses = 0
+        self.changes = 0
+        self.errors = 0
+        self.db = sqlite3.connect(filepath, timeout=busy_timeout, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS baidu_links (
+            link TEXT PRIMARY KEY,
+            status INTEGER NOT NULL,
+            host TEXT,
+            location TEXT,
+            fetched_at REAL NOT NULL,
+            used_at REAL NOT NULL
+        )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS baidu_links_used_at ON baidu_links (used_at)")
+        self.db.commit()
+
+    def get(self, link: str) -> tuple[int, str]:
+        now = time.time()
+        try:
+            row = self.db.execute("SELECT status, location, fetched_at FROM baidu_links WHERE link = ?", (link,)).fetchone()
+        except sqlite3.Error:
+            # a locked cache is a miss, the link is fetched
+            self.errors += 1
+            row = None
+        if row is None or (self.ttl and row[2] + self.ttl < now):
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            self.db.execute("UPDATE baidu_links SET used_at = ? WHERE link = ?", (now, link))
+            self.changed()
+        except sqlite3.Error:
+            self.errors += 1
+        return row[0], row[1]
+
+    def put(self, link: str, status: int, location: str):
+        # the redirect was fetched whether or not it can be cached
+        now = time.time()
+        host = urlparse(location).netloc if location else None
+        try:
+            self.db.execute("INSERT OR REPLACE INTO baidu_links (link, status, host, location, fetched_at, used_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (link, status, host, location, now, now))
+            self.puts += 1
+            if self.puts % self.evict_interval == 0:
+                self.evict()
+            else:
+                self.changed()
+        except sqlite3.Error:
+            self.errors += 1
+
+    def changed(self):
+        self.changes += 1
+        if self.changes >= self.commit_interval:
+            self.commit()
+
+    def commit(self):
+        self.db.commit()
+        self.changes = 0
+
+    def evict(self):
+        now = time.time()
+        if self.ttl:
+            self.db.execute("DELETE FROM baidu_links WHERE fetched_at < ?", (now - self.ttl,))
+        if self.max_entries:
+            # least recently used links are removed first
+            self.db.execute("""DELETE FROM baidu_links WHERE link IN (
+                SELECT link FROM baidu_links ORDER BY used_at DESC LIMIT -1 OFFSET ?)""", (self.max_entries,))
+        self.commit()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+    def close(self):
+        try:
+            self.evict()
+        except sqlite3.Error:
+            self.errors += 1
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
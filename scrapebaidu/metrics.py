@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+
+from collections.abc import Callable
+from contextlib import contextmanager
+import threading
+import json
+import math
+import time
+import os
+
+# seconds, from a cached link to a browser page that barely made it
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def labelKey(labels: dict) -> tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items())) if labels else ()
+
+class Histogram:
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        # upper bound of the bucket the quantile falls into, the largest value for the last bucket
+        if not self.count:
+            return 0.0
+        rank = math.ceil(q * self.count)
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+    def toDict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": {str(le): count for le, count in zip(list(self.buckets) + ["+Inf"], self.counts)}
+        }
+
+class Metrics:
+    # counters, gauges and latency histograms of a run, keyed by name and labels.
+    # Hooks are called as hook(name, seconds, labels) for every timing, so a profiler
+    # can be plugged in without touching the stages.
+    def __init__(self, options: dict = []):
+        self.buckets: tuple = options["buckets"] if "buckets" in options else DEFAULT_BUCKETS
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.help = {}
+        self.hooks: list[Callable] = []
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def addHook(self, hook: Callable):
+        self.hooks.append(hook)
+
+    def removeHook(self, hook: Callable):
+        self.hooks.remove(hook)
+
+    def describe(self, name: str, text: str):
+        self.help[name] = text
+
+    def inc(self, name: str, labels: dict = None, value: float = 1):
+        key = labelKey(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, labels: dict = None):
+        with self.lock:
+            self.gauges.setdefault(name, {})[labelKey(labels)] = value
+
+    def setMax(self, name: str, value: float, labels: dict = None):
+        key = labelKey(labels)
+        with self.lock:
+            series = self.gauges.setdefault(name, {})
+            series[key] = max(series.get(key, value), value)
+
+    def observe(self, name: str, seconds: float, labels: dict = None):
+        key = labelKey(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+        for hook in self.hooks:
+            hook(name, seconds, labels or {})
+
+    @contextmanager
+    def time(self, name: str, labels: dict = None):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - started, labels)
+
+    def toDict(self) -> dict:
+        def series(metric: dict, value: Callable) -> list:
+            return [{"labels": dict(key), **value(v)} for key, v in metric.items()]
+        with self.lock:
+            return {
+                "started": self.started,
+                "elapsed": round(time.time() - self.started, 3),
+                "counters": {name: series(s, lambda v: {"value": v}) for name, s in self.counters.items()},
+                "gauges": {name: series(s, lambda v: {"value": v}) for name, s in self.gauges.items()},
+                "histograms": {name: series(s, lambda v: v.toDict()) for name, s in self.histograms.items()}
+            }
+
+    def saveJson(self, filepath: str, extra: dict = {}):
+        # the run report: all metrics plus whatever the caller wants to add (limits, proxies, caches)
+        with open(filepath, "w") as fp:
+            json.dump({**self.toDict(), **extra}, fp, indent=2, ensure_ascii=False, default=str)
+
+    def toPrometheus(self) -> str:
+        def labels_text(key: tuple, extra: tuple = ()) -> str:
+            items = key + extra
+            if not items:
+                return ''
+            return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in items) + '}'
+        def escape(value: str) -> str:
+            return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        lines = []
+        with self.lock:
+            for kind, metrics in [("counter", self.counters), ("gauge", self.gauges)]:
+                for name, series in sorted(metrics.items()):
+                    if name in self.help:
+                        lines.append(f"# HELP {name} {self.help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in series.items():
+                        lines.append(f"{name}{labels_text(key)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                if name in self.help:
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for le, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{labels_text(key, (('le', str(le)),))} {cumulative}")
+                    lines.append(f"{name}_sum{labels_text(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{labels_text(key)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def savePrometheus(self, filepath: str):
+        # written to a temporary file first, so node_exporter's textfile collector never reads half a file
+        with open(filepath + ".tmp", "w") as fp:
+            fp.write(self.toPrometheus())
+        os.replace(filepath + ".tmp", filepath)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+
+from collections.abc import Iterable
+import threading
+from .dedupeindex import DedupeIndex
+
+class PageBudget:
+    # pages not used by keywords that stopped early, given to keywords that still find new links;
+    # a keyword gets at most `max_extra_pages` pages more than search_pages
+    def __init__(self, max_extra_pages: int = 5):
+        self.max_extra_pages = max_extra_pages
+        self.saved = 0
+        self.given = 0
+        self.lock = threading.Lock()
+
+    def save(self, pages: int):
+        with self.lock:
+            self.saved += max(0, pages)
+
+    def take(self, extra_pages: int) -> bool:
+        # extra_pages: pages the keyword already got over search_pages
+        with self.lock:
+            if self.saved <= 0 or extra_pages >= self.max_extra_pages:
+                return False
+            self.saved -= 1
+            self.given += 1
+            return True
+
+class PageDepth:
+    # paging of one keyword stops once `stale_pages` pages in a row brought fewer than
+    # `min_new_links` links that are neither in `seen`, in the dedupe index nor on an earlier page of the keyword
+    def __init__(self, seen: set[str], max_pages: int, options: dict = []):
+        self.stale_pages: int = options["early_stop_pages"] if "early_stop_pages" in options else 0
+        self.min_new_links: int = options["early_stop_min_new_links"] if "early_stop_min_new_links" in options else 1
+        self.budget: PageBudget = options["page_budget"] if "page_budget" in options else None
+        self.dedupe_index: DedupeIndex = options["dedupe_index"] if "dedupe_index" in options else None
+        self.seen = seen
+        self.max_pages = max_pages
+        self.links = set()
+        self.stale = 0
+        self.productive = True
+        self.stopped = False
+
+    def addPage(self, links: Iterable[str]):
+        new_links = 0
+        for link in links:
+            if link not in self.seen and link not in self.links and (self.dedupe_index is None or "link:" + link not in self.dedupe_index):
+                new_links += 1
+            self.links.add(link)
+        self.productive = new_links >= self.min_new_links
+        self.stale = 0 if self.productive else self.stale + 1
+
+    def nextPage(self, pages_loaded: int) -> bool:
+        if self.stale_pages and self.stale >= self.stale_pages:
+            if self.budget is not None:
+                self.budget.save(self.max_pages - pages_loaded)
+            self.stopped = True
+            return False
+        if pages_loaded < self.max_pages:
+            return True
+        return self.productive and self.budget is not None and self.budget.take(pages_loaded - self.max_pages)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+
+from logging import Logger
+from re import Pattern
+from collections.abc import Callable, Iterable
+import asyncio
+import threading
+import concurrent.futures
+from contextlib import nullcontext
+from .linkcache import LinkCache
+from .whoisstore import WhoisStore
+from .checkpoint import Checkpoint
+from .domains import PublicSuffixList
+from .ratelimit import AdaptiveLimiter
+from .proxypool import ProxyPool
+from .metrics import Metrics
+from .dedupeindex import DedupeIndex
+from .utils import extractBaiduLinks, createLinkSession, fetch, whois_lookup, sliding_window, addDoneLink, addCheckedHost
+
+class PendingLink(tuple):
+    # a link saved by an interrupted run: it is resolved, but not saved again
+    pass
+
+class Progress(tuple):
+    # search progress, recorded in the checkpoint once the links before it have been saved
+    pass
+
+async def aioRunPipeline(logger: Logger, search_list: list[str], max_pages: int, proxy_list: list[str], reject_patterns: list[Pattern], options: dict = [],
+        exclude_hosts: set[str] = set(), on_link: Callable = None, on_checked: Callable = None, on_whois: Callable = None):
+    # extract -> resolve -> whois run at the same time, connected with bounded queues:
+    # a full queue blocks the stage before it, so memory does not grow with the run
+    extract_options: dict = options["extract_options"] if "extract_options" in options else {}
+    inurl_filter: bool = options["inurl_filter"] if "inurl_filter" in options else False
+    indomain_filter: bool = options["indomain_filter"] if "indomain_filter" in options else False
+    resolve_links: bool = options["resolve_links"] if "resolve_links" in options else True
+    resolve_tasks: int = options["resolve_tasks"] if "resolve_tasks" in options else 6
+    whois_hosts: bool = options["whois_hosts"] if "whois_hosts" in options else False
+    whois_tasks: int = options["whois_tasks"] if "whois_tasks" in options else 3
+    whois_timeout: int = options["whois_timeout"] if "whois_timeout" in options else 10
+    queue_size: int = options["queue_size"] if "queue_size" in options else 1000
+    link_cache: LinkCache = options["link_cache"] if "link_cache" in options else None
+    whois_store: WhoisStore = options["whois_store"] if "whois_store" in options else None
+    checkpoint: Checkpoint = options["checkpoint"] if "checkpoint" in options else None
+    public_suffix_list: PublicSuffixList = options["public_suffix_list"] if "public_suffix_list" in options else None
+    # options may be the options of checkBaiduLinks, where the resolve limiter is "limiter"
+    resolve_limiter: AdaptiveLimiter = options["resolve_limiter"] if "resolve_limiter" in options else options["limiter"] if "limiter" in options else None
+    whois_limiter: AdaptiveLimiter = options["whois_limiter"] if "whois_limiter" in options else None
+    proxy_pool: ProxyPool = options["proxy_pool"] if "proxy_pool" in options else None
+    metrics: Metrics = options["metrics"] if "metrics" in options else None
+    whois_server: str = options["whois_server"] if "whois_server" in options else None
+    dedupe_index: DedupeIndex = options["dedupe_index"] if "dedupe_index" in options else None
+    # links and hosts that were saved, but not processed by an interrupted run
+    pending_links: Iterable = options["pending_links"] if "pending_links" in options else []
+    pending_hosts: Iterable = options["pending_hosts"] if "pending_hosts" in options else []
+
+    loop = asyncio.get_running_loop()
+    links_queue = asyncio.Queue(queue_size)
+    hosts_queue = asyncio.Queue(queue_size)
+    stop_event = threading.Event()
+    done = object()
+
+    def stage_timer(stage: str):
+        # wall-clock time of a stage, from the start of the run until the stage is done
+        return metrics.time("stage_seconds", {"stage": stage}) if metrics is not None else nullcontext()
+
+    def timed(stage: str, run: Callable):
+        def timed_run():
+            with stage_timer(stage):
+                return run()
+        return timed_run
+
+    async def timed_async(stage: str, run: Callable):
+        with stage_timer(stage):
+            await run()
+
+    def queue_depth(name: str, queue: asyncio.Queue):
+        if metrics is not None:
+            metrics.set("pipeline_queue_depth", queue.qsize(), {"queue": name})
+            metrics.setMax("pipeline_queue_depth_max", queue.qsize(), {"queue": name})
+
+    def put_link(item) -> bool:
+        future = asyncio.run_coroutine_threadsafe(links_queue.put(item), loop)
+        while True:
+            try:
+                future.result(1)
+                return True
+            except concurrent.futures.TimeoutError:
+                if stop_event.is_set():
+                    future.cancel()
+                    return False
+
+    def extract():
+        try:
+            for row in pending_links:
+                if not put_link(PendingLink(row)):
+                    return
+            if checkpoint is not None:
+                extract_options_with_progress = {
+                    **extract_options,
+                    "on_keyword_done": lambda search: put_link(Progress(("keyword", search)))
+                }
+            else:
+                extract_options_with_progress = extract_options
+            for row in extractBaiduLinks(logger, search_list, max_pages, proxy_list, extract_options_with_progress):
+                if not put_link(row):
+                    break
+        finally:
+            put_link(done)
+
+    async def link_source():
+        while True:
+            queue_depth("links", links_queue)
+            row = await links_queue.get()
+            if row is done:
+                break
+            if type(row) is Progress:
+                checkpoint.keywordDone(row[1])
+                continue
+            if type(row) is not PendingLink and on_link is not None:
+                on_link(row)
+            if not resolve_links:
+                addDoneLink(dedupe_index, row[0])
+                continue
+            link, search = row[0], row[1]
+            if checkpoint is not None and checkpoint.isLinkResolved(link):
+                continue
+            yield fetch(logger, link, reject_patterns, {
+                "inurl_filter": inurl_filter,
+                "indomain_filter": indomain_filter,
+                "search": search,
+                "session": session,
+                "link_cache": link_cache,
+                "limiter": resolve_limiter,
+                "proxy_pool": proxy_pool,
+                "metrics": metrics
+            })
+
+    def is_new_host(host: str) -> bool:
+        if host in exclude_hosts:
+            return False
+        if checkpoint is not None and checkpoint.isHostChecked(host):
+            return False
+        if dedupe_index is not None and "host:" + host in dedupe_index:
+            return False
+        return whois_store is None or whois_store.isDue(host)
+
+    # hosts waiting for whois of their registrable domain, and the results of checked domains
+    domain_hosts = {}
+    domain_results = {}
+
+    def whois_done(host: str, status: str, whois_result):
+        if on_whois is not None:
+            on_whois((host, status, whois_result))
+        if checkpoint is not None:
+            checkpoint.hostChecked(host)
+        addCheckedHost(dedupe_index, host, status, whois_result)
+
+    async def check_host(host: str):
+        domain = public_suffix_list.registrableDomain(host) if public_suffix_list is not None else host
+        if domain in domain_results:
+            whois_done(host, *domain_results[domain])
+        elif domain in domain_hosts:
+            domain_hosts[domain].append(host)
+        else:
+            domain_hosts[domain] = [host]
+            await hosts_queue.put(domain)
+
+    async def resolve():
+        hosts = set()
+        try:
+            if whois_hosts:
+                for host in pending_hosts:
+                    if host and host not in hosts:
+                        hosts.add(host)
+                        if is_new_host(host):
+                            await check_host(host)
+            async for requestURL, responseStatus, responseResult in sliding_window(link_source(), resolve_tasks):
+                if on_checked is not None:
+                    on_checked((requestURL, responseStatus, responseResult))
+                if checkpoint is not None:
+                    checkpoint.linkResolved(requestURL)
+                addDoneLink(dedupe_index, requestURL, responseStatus)
+                if whois_hosts and responseStatus == 'OK':
+                    host = responseResult['host']
+                    # new hosts go to whois as soon as they are first seen
+                    if host and host not in hosts:
+                        hosts.add(host)
+                        if is_new_host(host):
+                            await check_host(host)
+        finally:
+            if not stop_event.is_set():
+                await hosts_queue.put(done)
+
+    async def host_source():
+        while True:
+            queue_depth("hosts", hosts_queue)
+            domain = await hosts_queue.get()
+            if domain is done:
+                break
+            logger.debug(f"Checking whois for {domain}")
+            yield whois_lookup(logger, domain, whois_timeout, whois_limiter, metrics, whois_server)
+
+    async def whois():
+        async for domain, status, whois_result in sliding_window(host_source(), whois_tasks):
+            if public_suffix_list is not None:
+                domain_results[domain] = (status, whois_result)
+            for host in domain_hosts.pop(domain):
+                whois_done(host, status, whois_result)
+
+    session = createLinkSession(options)
+    try:
+        extract_future = loop.run_in_executor(None, timed("extract", extract))
+        stages = asyncio.gather(timed_async("resolve", resolve), timed_async("whois", whois))
+        try:
+            await stages
+        except BaseException:
+            stop_event.set()
+            stages.cancel()
+            raise
+        finally:
+            # wait for the extraction thread, it stops at the next link once stop_event is set
+            await asyncio.wait([extract_future])
+        extract_future.result()
+    finally:
+        await session.close()
+
+def runPipeline(logger: Logger, search_list: list[str], max_pages: int, proxy_list: list[str], reject_patterns: list[Pattern], loop: asyncio.AbstractEventLoop, options: dict = [],
+        exclude_hosts: set[str] = set(), on_link: Callable = None, on_checked: Callable = None, on_whois: Callable = None):
+    loop.run_until_complete(aioRunPipeline(logger, search_list, max_pages, proxy_list, reject_patterns, options,
+        exclude_hosts, on_link, on_checked, on_whois))
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+
+from logging import Logger
+import threading
+import time
+
+class ProxyHealth:
+    def __init__(self, proxy: str):
+        self.proxy = proxy
+        self.successes = 0
+        self.failures = 0
+        self.captchas = 0
+        self.empties = 0
+        self.latency: float = None
+        self.in_use = 0
+        self.consecutive_failures = 0
+        self.consecutive_empties = 0
+        self.cooldowns = 0
+        self.cooldown_until = 0.0
+
+class ProxyPool:
+    # hands out the healthiest of the least used proxies: a proxy that is not in use is always
+    # preferred, so parallel searches get a proxy each; among them the best success rate
+    # per second of page latency wins. A proxy that shows a captcha, fails
+    # `failure_threshold` times or returns `empty_threshold` empty results in a row is put into
+    # a cooldown, which doubles with every cooldown in a row up to `max_cooldown` seconds.
+    # Every acquire() is followed by exactly one success(), empty(), failure(), captcha() or release().
+    def __init__(self, logger: Logger, proxy_list: list[str], options: dict = []):
+        self.logger = logger
+        self.cooldown: float = options["cooldown"] if "cooldown" in options else 60
+        self.max_cooldown: float = options["max_cooldown"] if "max_cooldown" in options else 900
+        self.failure_threshold: int = options["failure_threshold"] if "failure_threshold" in options else 2
+        self.empty_threshold: int = options["empty_threshold"] if "empty_threshold" in options else 3
+        self.latency_alpha: float = options["latency_alpha"] if "latency_alpha" in options else 0.3
+        self.proxies = {proxy: ProxyHealth(proxy) for proxy in proxy_list if proxy}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.proxies)
+
+    def score(self, health: ProxyHealth, default_latency: float) -> float:
+        success_rate = (health.successes + 1) / (health.successes + health.failures + health.captchas + 2)
+        latency = health.latency if health.latency is not None else default_latency
+        return success_rate / max(latency, 0.01)
+
+    def acquire(self) -> str:
+        if not self.proxies:
+            return ''
+        with self.lock:
+            now = time.monotonic()
+            available = [health for health in self.proxies.values() if health.cooldown_until <= now]
+            if available:
+                # proxies without a measured latency get the average, so they are tried as well
+                latencies = [health.latency for health in self.proxies.values() if health.latency is not None]
+                default_latency = sum(latencies) / len(latencies) if latencies else 1.0
+                health = max(available, key=lambda health: (-health.in_use, self.score(health, default_latency)))
+            else:
+                health = min(self.proxies.values(), key=lambda health: health.cooldown_until)
+                self.logger.debug(f"all proxies are cooling down, using '{health.proxy}'")
+            health.in_use += 1
+            return health.proxy
+
+    def release(self, proxy: str):
+        health = self.proxies.get(proxy)
+        if health is not None:
+            with self.lock:
+                health.in_use -= 1
+
+    def updateLatency(self, health: ProxyHealth, latency: float):
+        if latency is not None:
+            health.latency = latency if health.latency is None else health.latency + self.latency_alpha * (latency - health.latency)
+
+    def coolDown(self, health: ProxyHealth, reason: str):
+        health.cooldowns += 1
+        duration = min(self.max_cooldown, self.cooldown * 2 ** (health.cooldowns - 1))
+        health.cooldown_until = time.monotonic() + duration
+        health.consecutive_failures = 0
+        health.consecutive_empties = 0
+        self.logger.info(f"proxy '{health.proxy}' cooling down for {duration:.0f}s: {reason}")
+
+    def success(self, proxy: str, latency: float = None):
+        health = self.proxies.get(proxy)
+        if health is None:
+            return
+        with self.lock:
+            health.in_use -= 1
+            health.successes += 1
+            health.consecutive_failures = 0
+            health.consecutive_empties = 0
+            health.cooldowns = 0
+            self.updateLatency(health, latency)
+
+    def empty(self, proxy: str, latency: float = None):
+        # an empty result may be real, but a series of them means the proxy is blocked
+        health = self.proxies.get(proxy)
+        if health is None:
+            return
+        with self.lock:
+            health.in_use -= 1
+            health.empties += 1
+            health.consecutive_empties += 1
+            self.updateLatency(health, latency)
+            if health.consecutive_empties >= self.empty_threshold:
+                self.coolDown(health, f"{health.consecutive_empties} empty results in a row")
+
+    def failure(self, proxy: str, reason: str):
+        health = self.proxies.get(proxy)
+        if health is None:
+            return
+        with self.lock:
+            health.in_use -= 1
+            health.failures += 1
+            health.consecutive_failures += 1
+            if health.consecutive_failures >= self.failure_threshold:
+                self.coolDown(health, reason)
+
+    def captcha(self, proxy: str):
+        health = self.proxies.get(proxy)
+        if health is None:
+            return
+        with self.lock:
+            health.in_use -= 1
+            health.captchas += 1
+            self.coolDown(health, "captcha")
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {health.proxy: {
+                "successes": health.successes,
+                "failures": health.failures,
+                "captchas": health.captchas,
+                "empties": health.empties,
+                "latency": health.latency,
+                "cooldowns": health.cooldowns
+            } for health in self.proxies.values()}
+
+    def report(self) -> str:
+        return "proxies: " + (", ".join(
+            f"{proxy}: {s['successes']} ok, {s['failures']} failed, {s['captchas']} captcha, {s['empties']} empty"
+            + (f", {s['latency']:.2f}s" if s['latency'] is not None else "")
+            for proxy, s in self.stats().items()) or '-')
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+
+from logging import Logger
+from collections import deque
+import asyncio
+import time
+import sys
+
+def isThrottleError(e: Exception) -> bool:
+    # timeouts and dropped connections are how whois servers and baidu push back
+    if isinstance(e, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    # aiohttp is imported by the stages that fetch pages, whois lookups do not need it
+    aiohttp = sys.modules.get("aiohttp")
+    if aiohttp is not None and isinstance(e, aiohttp.ServerDisconnectedError):
+        return True
+    msg = str(e).lower()
+    return "timed out" in msg or "connection reset" in msg
+
+class TargetBudget:
+    def __init__(self, limit: float):
+        self.limit = limit
+        self.in_flight = 0
+        self.successes = 0
+        self.failures = 0
+        self.throttles = 0
+        self.decreased_at = 0.0
+        self.blocked_until = 0.0
+        self.waiters = []
+
+class AdaptiveLimiter:
+    # concurrency budget per target (a whois TLD, a link host), adjusted with AIMD:
+    # the limit grows by `increase` for every `limit` successful requests and is multiplied
+    # by `decrease` on timeouts and connection resets; after a throttle, new requests
+    # to the target are held back for `backoff` seconds
+    def __init__(self, logger: Logger, name: str, options: dict = []):
+        self.logger = logger
+        self.name = name
+        self.initial_limit: float = options["initial_limit"] if "initial_limit" in options else 3
+        self.min_limit: float = options["min_limit"] if "min_limit" in options else 1
+        self.max_limit: float = options["max_limit"] if "max_limit" in options else 10
+        self.increase: float = options["increase"] if "increase" in options else 1
+        self.decrease: float = options["decrease"] if "decrease" in options else 0.5
+        self.backoff: float = options["backoff"] if "backoff" in options else 1.0
+        self.budgets = {}
+        self.events = deque(maxlen=options["max_events"] if "max_events" in options else 100)
+        self.throttle_count = 0
+
+    def budget(self, target: str) -> TargetBudget:
+        budget = self.budgets.get(target)
+        if budget is None:
+            budget = TargetBudget(max(self.min_limit, min(self.max_limit, self.initial_limit)))
+            self.budgets[target] = budget
+        return budget
+
+    async def acquire(self, target: str) -> float:
+        # waits for a free slot of the target, returns the start time to pass to release()
+        budget = self.budget(target)
+        while budget.in_flight >= int(budget.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            budget.waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in budget.waiters:
+                    budget.waiters.remove(waiter)
+        budget.in_flight += 1
+        delay = budget.blocked_until - time.monotonic()
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except BaseException:
+                self.release(target)
+                raise
+        return time.monotonic()
+
+    def release(self, target: str):
+        budget = self.budgets[target]
+        budget.in_flight -= 1
+        # waiters check the limit again, so all of them are woken up
+        for waiter in budget.waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def success(self, target: str):
+        budget = self.budgets[target]
+        budget.successes += 1
+        budget.limit = min(self.max_limit, budget.limit + self.increase / budget.limit)
+        self.release(target)
+
+    def failure(self, target: str):
+        # the target answered, but with an error: the budget stays as it is
+        self.budgets[target].failures += 1
+        self.release(target)
+
+    def throttled(self, target: str, started: float, reason: str):
+        budget = self.budgets[target]
+        budget.throttles += 1
+        self.throttle_count += 1
+        now = time.monotonic()
+        # requests that were started before the last decrease don't decrease the limit again
+        if started >= budget.decreased_at:
+            old_limit = budget.limit
+            budget.limit = max(self.min_limit, budget.limit * self.decrease)
+            budget.decreased_at = now
+            budget.blocked_until = now + self.backoff
+            self.events.append({"time": time.time(), "target": target, "reason": reason, "limit": budget.limit})
+            self.logger.debug(f"{self.name}: '{target}' throttled ({reason}), limit {old_limit:.1f} -> {budget.limit:.1f}")
+        self.release(target)
+
+    def stats(self) -> dict:
+        return {
+            "targets": {target: {
+                "limit": round(budget.limit, 2),
+                "successes": budget.successes,
+                "failures": budget.failures,
+                "throttles": budget.throttles
+            } for target, budget in self.budgets.items()},
+            "throttles": self.throttle_count,
+            "throttle_events": list(self.events)
+        }
+
+    def report(self) -> str:
+        targets = ", ".join(f"{target}: {budget.limit:.1f}" + (f" ({budget.throttles} throttled)" if budget.throttles else "")
+            for target, budget in sorted(self.budgets.items()))
+        return f"{self.name} limits: {targets or '-'}, throttle events: {self.throttle_count}"
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+
+from collections.abc import Iterable
+from datetime import datetime, timezone
+import csv
+import gzip
+import io
+import json
+import os
+
+# output_format -> file extension, used instead of '.csv'
+OUTPUT_FORMATS = {
+    "csv": ".csv",
+    "jsonl.gz": ".jsonl.gz",
+    "jsonl.zst": ".jsonl.zst",
+    "parquet": ".parquet"
+}
+
+# zstandard and pyarrow are optional and slow to import, they are imported by the formats that use them
+def importZstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("output_format 'jsonl.zst' requires the zstandard package")
+    return zstandard
+
+def importPyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("output_format 'parquet' requires the pyarrow package")
+    return pyarrow
+
+def checkOutputFormat(output_format: str):
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Bad output format: '{output_format}'")
+    if output_format == "jsonl.zst":
+        importZstandard()
+    if output_format == "parquet":
+        importPyarrow()
+
+def recordFormat(filepath: str, default: str = "csv") -> str:
+    # the output format of a file given by its full name
+    for output_format, extension in OUTPUT_FORMATS.items():
+        if filepath.endswith(extension):
+            return output_format
+    return default
+
+def outputPath(filepath: str, output_format: str = "csv") -> str:
+    # filepath is the name of the file in any output format; a name without the extension
+    # of an output format (e.g. links.txt) is the name of a csv file
+    current_format = recordFormat(filepath, None)
+    if current_format is None:
+        return filepath if output_format == "csv" else filepath + OUTPUT_FORMATS[output_format]
+    return filepath[:-len(OUTPUT_FORMATS[current_format])] + OUTPUT_FORMATS[output_format]
+
+def parquetParts(filepath: str) -> list[str]:
+    # parquet files cannot be appended to, a resumed run writes name.1.parquet, name.2.parquet, ...
+    base = filepath[:-len(".parquet")]
+    parts = []
+    while os.path.exists(filepath):
+        parts.append(filepath)
+        filepath = f"{base}.{len(parts)}.parquet"
+    return parts
+
+def typedValue(value, column_type: str):
+    # csv rows carry strings, typed formats get booleans, integers and timestamps
+    if column_type == "bool":
+        return bool(value)
+    if value is None or value == '':
+        return None if column_type != "string" else value
+    if column_type == "int":
+        return int(value)
+    if column_type == "timestamp" and not isinstance(value, datetime):
+        try:
+            return datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+    if column_type == "string" and not isinstance(value, str):
+        return str(value)
+    return value
+
+def parquetValue(value):
+    # a naive datetime is local time, as datetime.timestamp() takes it
+    return value.astimezone(timezone.utc) if isinstance(value, datetime) and value.tzinfo is None else value
+
+def jsonValue(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+class CsvRecordWriter:
+    def __init__(self, filepath: str, columns: list[tuple[str, str]], append: bool = False):
+        self.fp = open(filepath, "a" if append else "w", newline='')
+        self.writer = csv.writer(self.fp, quoting=csv.QUOTE_ALL)
+
+    def write(self, row: list):
+        self.writer.writerow(row)
+
+    def flush(self, fsync: bool = False):
+        self.fp.flush()
+        if fsync:
+            os.fsync(self.fp.fileno())
+
+    def close(self):
+        self.fp.close()
+
+class JsonlRecordWriter:
+    # one json object per line; gzip members and zstd frames can be appended to, so a resumed run appends
+    def __init__(self, filepath: str, columns: list[tuple[str, str]], append: bool = False, compression: str = "gzip"):
+        self.columns = columns
+        self.raw = open(filepath, "ab" if append else "wb")
+        self.zstandard = importZstandard() if compression == "zstd" else None
+        if self.zstandard is not None:
+            self.stream = self.zstandard.ZstdCompressor().stream_writer(self.raw, closefd=False)
+        else:
+            self.stream = gzip.GzipFile(fileobj=self.raw, mode="wb")
+        self.fp = io.TextIOWrapper(self.stream, encoding="utf8", newline='\n')
+
+    def write(self, row: list):
+        record = {name: typedValue(value, column_type) for (name, column_type), value in zip(self.columns, row)}
+        self.fp.write(json.dumps(record, ensure_ascii=False, default=jsonValue) + "\n")
+
+    def flush(self, fsync: bool = False):
+        # a flushed block can be decompressed, so the file is readable up to here after a crash
+        self.fp.flush()
+        if self.zstandard is not None:
+            self.stream.flush(self.zstandard.FLUSH_BLOCK)
+        else:
+            self.stream.flush()
+        self.raw.flush()
+        if fsync:
+            os.fsync(self.raw.fileno())
+
+    def close(self):
+        self.fp.close()
+        self.raw.close()
+
+class ParquetRecordWriter:
+    # rows are written in row groups of row_group_size; a parquet file is readable only once it is closed
+    def __init__(self, filepath: str, columns: list[tuple[str, str]], append: bool = False, row_group_size: int = 10000):
+        if append:
+            filepath = f"{filepath[:-len('.parquet')]}.{len(parquetParts(filepath))}.parquet" if os.path.exists(filepath) else filepath
+        else:
+            for part in parquetParts(filepath)[1:]:
+                os.remove(part)
+        pyarrow = self.pyarrow = importPyarrow()
+        # timestamps are stored in UTC and read back as aware datetimes
+        types = {"string": pyarrow.string(), "bool": pyarrow.bool_(), "int": pyarrow.int64(), "timestamp": pyarrow.timestamp("s", tz="UTC")}
+        self.columns = columns
+        self.schema = pyarrow.schema([(name, types[column_type]) for name, column_type in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(filepath, self.schema, compression="zstd")
+        self.row_group_size = row_group_size
+        self.rows = []
+
+    def write(self, row: list):
+        self.rows.append({name: parquetValue(typedValue(value, column_type)) for (name, column_type), value in zip(self.columns, row)})
+        if len(self.rows) >= self.row_group_size:
+            self.writeRows()
+
+    def writeRows(self):
+        if self.rows:
+            self.writer.write_table(self.pyarrow.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    def flush(self, fsync: bool = False):
+        # small row groups make parquet slow to read, rows wait for a full row group or close()
+        pass
+
+    def close(self):
+        self.writeRows()
+        self.writer.close()
+
+def openRecordWriter(filepath: str, columns: list[tuple[str, str]], output_format: str = "csv", append: bool = False):
+    # filepath is the name of the csv file, the extension is replaced for other formats
+    checkOutputFormat(output_format)
+    filepath = outputPath(filepath, output_format)
+    if output_format == "jsonl.gz":
+        return JsonlRecordWriter(filepath, columns, append, "gzip")
+    if output_format == "jsonl.zst":
+        return JsonlRecordWriter(filepath, columns, append, "zstd")
+    if output_format == "parquet":
+        return ParquetRecordWriter(filepath, columns, append)
+    return CsvRecordWriter(filepath, columns, append)
+
+def readRecords(filepath: str, columns: list[tuple[str, str]], output_format: str = "csv", names: list[str] = None) -> Iterable[dict]:
+    # streams the records of an output file as dicts; parquet reads only the `names` columns,
+    # csv rows that are shorter than columns leave the missing names out
+    checkOutputFormat(output_format)
+    filepath = outputPath(filepath, output_format)
+    if output_format == "parquet":
+        pyarrow = importPyarrow()
+        for part in parquetParts(filepath):
+            for batch in pyarrow.parquet.ParquetFile(part).iter_batches(columns=names):
+                # files written without a timezone hold UTC as well
+                naive = [field.name for field in batch.schema if pyarrow.types.is_timestamp(field.type) and field.type.tz is None]
+                for record in batch.to_pylist():
+                    for name in naive:
+                        if record[name] is not None:
+                            record[name] = record[name].replace(tzinfo=timezone.utc)
+                    yield record
+        return
+    if not os.path.exists(filepath):
+        return
+    if output_format == "csv":
+        with open(filepath, "r", newline='') as fp:
+            for row in csv.reader(fp):
+                record = {name: value for (name, column_type), value in zip(columns, row)}
+                yield {name: record[name] for name in names if name in record} if names else record
+        return
+    if output_format == "jsonl.zst":
+        raw = open(filepath, "rb")
+        fp = io.TextIOWrapper(importZstandard().ZstdDecompressor().stream_reader(raw, read_across_frames=True), encoding="utf8")
+    else:
+        raw = None
+        fp = gzip.open(filepath, "rt", encoding="utf8")
+    try:
+        for line in fp:
+            if line.strip():
+                record = json.loads(line)
+                yield {name: record.get(name) for name in names} if names else record
+    except EOFError:
+        # the last gzip member of a run that was killed is not complete, the flushed lines before it are read
+        pass
+    finally:
+        fp.close()
+        if raw is not None:
+            raw.close()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+
+from logging import Logger
+from collections.abc import Iterable
+from datetime import datetime
+import os
+import time
+from .records import openRecordWriter, readRecords, outputPath
+
+# columns of the output files, by the name of their csv file; typed formats use the column types
+OUTPUT_COLUMNS = {
+    "baidu_extracted_links.csv": [("link", "string"), ("search", "string"), ("pn", "string"), ("inurl", "bool")],
+    "baidu_links_success.csv": [("link", "string"), ("host", "string"), ("location", "string")],
+    "baidu_links_failed.csv": [("link", "string"), ("result", "string")],
+    "baidu_links_empty.csv": [("link", "string"), ("result", "string")],
+    "baidu_links_rejected.csv": [("link", "string"), ("result", "string")],
+    "baidu_links_other.csv": [("link", "string"), ("status", "string"), ("result", "string")],
+    "baidu_whois_expired.csv": [("host", "string"), ("expires", "timestamp"), ("expires_str", "string"), ("query_output", "string")],
+    "baidu_whois_not_found.csv": [("host", "string"), ("query_output", "string")],
+    "baidu_whois_failed.csv": [("host", "string"), ("query_output", "string")],
+    "baidu_whois_no_expires.csv": [("host", "string"), ("status", "string"), ("expires_str", "string"), ("query_output", "string")],
+    "baidu_whois_not_expired.csv": [("host", "string"), ("status", "string"), ("expires", "timestamp"), ("expires_str", "string"), ("query_output", "string")]
+}
+
+def outputColumns(filepath: str) -> list[tuple[str, str]]:
+    # by the file name in any output format
+    return OUTPUT_COLUMNS[outputPath(os.path.basename(filepath))]
+
+def loadRecords(filepath: str, output_format: str = "csv", names: list[str] = None, columns: list[tuple[str, str]] = None) -> Iterable[dict]:
+    # records of an output file, filepath is the name of its csv file; with `names`,
+    # only these columns are returned (and read, for parquet). Files with other names need their `columns`
+    return readRecords(filepath, columns or outputColumns(filepath), output_format, names)
+
+class RecordSink:
+    # routes every row to its category file as it arrives, in output_format (csv, jsonl.gz, jsonl.zst, parquet);
+    # files are flushed (and fsynced if `fsync`) at most every `flush_interval` seconds
+    def __init__(self, dir: str, filenames: dict[str, str], options: dict = [], rewrite: list[str] = [], columns: dict[str, list[tuple[str, str]]] = {}):
+        self.flush_interval: float = options["flush_interval"] if "flush_interval" in options else 1.0
+        self.fsync: bool = options["fsync"] if "fsync" in options else False
+        self.output_format: str = options["output_format"] if "output_format" in options else "csv"
+        # parquet files are readable only once they are closed, flush() does not make rows durable
+        self.flushable = self.output_format != "parquet"
+        append: bool = options["append"] if "append" in options else False
+        self.writers = {}
+        try:
+            for name, filename in filenames.items():
+                self.writers[name] = openRecordWriter(os.path.join(dir, filename), columns[name] if name in columns else outputColumns(filename), self.output_format, append and name not in rewrite)
+        except Exception:
+            self.close()
+            raise
+        self.flushed_at = time.monotonic()
+
+    def writerow(self, name: str, row: list):
+        self.writers[name].write(row)
+        if time.monotonic() - self.flushed_at >= self.flush_interval:
+            self.flush()
+
+    def text(self, value) -> str or bytes:
+        # csv files keep the bytes repr they always had, typed formats get the text, lines of whois output joined
+        if self.output_format == "csv":
+            return str(value).encode("utf8")
+        return "\n".join(str(line) for line in value) if isinstance(value, list) else str(value)
+
+    def flush(self):
+        for writer in self.writers.values():
+            writer.flush(self.fsync)
+        self.flushed_at = time.monotonic()
+
+    def close(self):
+        if self.writers and self.fsync:
+            self.flush()
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class ExtractedLinksSink(RecordSink):
+    def __init__(self, filepath: str, inurl: bool = False, options: dict = []):
+        # the extracted links file may have any name
+        super().__init__(os.path.dirname(filepath), {"links": os.path.basename(filepath)}, options, [],
+            {"links": OUTPUT_COLUMNS["baidu_extracted_links.csv"]})
+        self.inurl = inurl
+
+    def write(self, baidu_link: tuple[str, str, str]):
+        link, search, pn = baidu_link
+        self.writerow("links", [link, search, pn, "inurl" if self.inurl else ''])
+
+class CheckedLinksSink(RecordSink):
+    def __init__(self, dir: str, options: dict = []):
+        super().__init__(dir, {
+            "OK": "baidu_links_success.csv",
+            "FAILED": "baidu_links_failed.csv",
+            "EMPTY": "baidu_links_empty.csv",
+            "REJECTED": "baidu_links_rejected.csv",
+            "other": "baidu_links_other.csv"
+        }, options)
+        self.hosts = set()
+
+    def write(self, checked_link: tuple[str, str, str]):
+        requestURL, responseStatus, responseResult = checked_link
+        if responseStatus == 'OK':
+            self.writerow('OK', [requestURL,responseResult['host'],responseResult['location']])
+            self.hosts.add(responseResult['host'])
+        elif responseStatus in ['FAILED','EMPTY','REJECTED']:
+            self.writerow(responseStatus, [requestURL,responseResult])
+        else:
+            self.writerow('other', [requestURL,responseStatus,responseResult])
+
+class WhoisSink(RecordSink):
+    def __init__(self, logger: Logger, dir: str, whois_not_expired: list[str or tuple[str, ...]], options: dict = []):
+        super().__init__(dir, {
+            "expired": "baidu_whois_expired.csv",
+            "NOT_FOUND": "baidu_whois_not_found.csv",
+            "FAILED": "baidu_whois_failed.csv",
+            "NO_EXPIRES": "baidu_whois_no_expires.csv",
+            "not_expired": "baidu_whois_not_expired.csv"
+        }, options, ["not_expired"])
+        self.logger = logger
+        # baidu_whois_not_expired.csv is rewritten with the rows that are still valid
+        for row in whois_not_expired:
+            self.writerow("not_expired", row)
+
+    def write(self, whois_info: tuple[str, str, dict or str]):
+        host, status, whois_result = whois_info
+        if status == 'OK':
+            if whois_result['expires'] is not None:
+                if datetime.timestamp(whois_result['expires']) <= datetime.timestamp(datetime.now()):
+                    self.writerow("expired", [host,whois_result['expires'].isoformat(),whois_result['expires_str'],self.text(whois_result['query_output'])])
+                else:
+                    self.writerow("not_expired", [host,status,whois_result['expires'].isoformat(),whois_result['expires_str'],self.text(whois_result['query_output'])])
+            else:
+                self.logger.debug(f"no 'expires' info in whois for '{host}'")
+                self.writerow("NO_EXPIRES", [host,'NO_EXPIRES',whois_result['expires_str'],self.text(whois_result['query_output'])])
+        elif status in ['NOT_FOUND', 'FAILED']:
+            self.writerow(status, [host,self.text(whois_result)])
+        else:
+            self.writerow("not_expired", [host,status,self.text(whois_result)])
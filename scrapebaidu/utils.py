@@ -4,39 +4,41 @@
 #
 # scrapebaidu - scrapes baidu search results and resolves target links.
 
-from xmlrpc.client import boolean
-from selenium import webdriver
-from selenium.webdriver.chrome.webdriver import WebDriver
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.common.keys import Keys
+# selenium, aiohttp, asyncwhois and dateutil are imported by the functions that use them,
+# so a stage that does not need them starts fast and runs without them installed
+from __future__ import annotations
+from typing import TYPE_CHECKING
 from logging import Logger
 import re
 from re import Pattern
 import asyncio
-from aiohttp import ClientSession, ClientTimeout
-import asyncwhois
-from asyncwhois.errors import NotFoundError
 from datetime import datetime
-import dateutil.parser
 import os
 from urllib.parse import urlparse, quote
 import time
-from itertools import cycle
-import csv
-from collections.abc import Iterable
-
-def parsePage(browser: WebDriver, logger: Logger, pn: str, url_links: list[str], page_links: list[str]) -> str:
-    url_link_re = re.compile(r"\/\/www\.baidu\.com\/link\?url=[^&]+")
-    page_link_re = re.compile(r"\/\/www\.baidu\.com\/s\?(.+&)?pn=([1-9][0-9]*)0(&.+|$)")
-    links = browser.find_elements(by=By.TAG_NAME, value="a")
-    for link in links:
-        href = link.get_attribute("href")
+import threading
+from queue import Queue, Empty
+from concurrent.futures import Future
+from collections.abc import Iterable, AsyncIterator, Awaitable, Callable
+from .browserpool import BrowserPool, createChromeBrowser
+from .linkcache import LinkCache
+from .domains import PublicSuffixList
+from .ratelimit import AdaptiveLimiter, isThrottleError
+from .proxypool import ProxyPool
+from .metrics import Metrics
+from .pagedepth import PageDepth
+from .dedupeindex import DedupeIndex
+from .sinks import CheckedLinksSink, WhoisSink, ExtractedLinksSink, loadRecords, OUTPUT_COLUMNS
+from .httpserp import BAIDU_URL, createSerpSession, aioExtractSearchBaiduLinksHttp, isBaiduCaptchaUrl
+if TYPE_CHECKING:
+    from selenium.webdriver.chrome.webdriver import WebDriver
+    from aiohttp import ClientSession
+
+url_link_re = re.compile(r"\/\/www\.baidu\.com\/link\?url=[^&]+")
+page_link_re = re.compile(r"\/\/www\.baidu\.com\/s\?(.+&)?pn=([1-9][0-9]*)0(&.+|$)")
+
+def parseLinks(logger: Logger, hrefs: Iterable[str], pn: str, url_links: list[str], page_links: list[str]) -> str:
+    for href in hrefs:
         # logger.debug("link:href:"+str(href or ''))
         if href is not None:
             m = url_link_re.search(href)
@@ -57,244 +59,483 @@ def parsePage(browser: WebDriver, logger: Logger, pn: str, url_links: list[str],
                 #    logger.debug(f"pn {page_pn} already exists")
     return pn
 
-def delete_cache(driver):
+def parsePage(browser: WebDriver, logger: Logger, pn: str, url_links: list[str], page_links: list[str], bulk: bool = True) -> str:
+    from selenium.webdriver.common.by import By
+    if bulk:
+        # all hrefs are collected in a single WebDriver round trip
+        hrefs = browser.execute_script("return Array.from(document.getElementsByTagName('a'), function(a) { return typeof a.href === 'string' ? a.href : null; });")
+    else:
+        hrefs = (link.get_attribute("href") for link in browser.find_elements(by=By.TAG_NAME, value="a"))
+    return parseLinks(logger, hrefs or [], pn, url_links, page_links)
+
+# one round trip tells which of the possible outcomes a search page has reached:
+# a captcha, a browser error page, "no results", or results (#page, or a complete page with #content_left)
+page_state_script = """
+if (location.href.indexOf('captcha') >= 0 || document.querySelector('.vcode-body, #seccaptcha, .passMod_dialog-body')) return 'captcha';
+if (location.href.indexOf('chrome-error://') === 0 || document.getElementById('main-frame-error')) return 'error';
+if (document.querySelector('.nors')) return 'not_found';
+if (document.getElementById('page') || (document.readyState === 'complete' && document.getElementById('content_left'))) return 'results';
+return null;
+"""
+
+def waitPageState(browser: WebDriver, timeout: float) -> str:
+    # returns as soon as the page reaches any outcome: 'results', 'not_found', 'captcha', 'error',
+    # or 'timeout' if none of them shows up in time
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import TimeoutException
+    try:
+        return WebDriverWait(browser, timeout, poll_frequency=0.1).until(lambda driver: driver.execute_script(page_state_script))
+    except TimeoutException:
+        return 'timeout'
+
+def delete_cache(driver, timeout: float = 30):
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.common.action_chains import ActionChains
+    from selenium.webdriver.common.keys import Keys
+    handles = len(driver.window_handles)
     driver.execute_script("window.open('');")
-    time.sleep(2)
+    WebDriverWait(driver, timeout).until(EC.number_of_windows_to_be(handles + 1))
     driver.switch_to.window(driver.window_handles[-1])
-    time.sleep(2)
     driver.get('chrome://settings/clearBrowserData') # for old chromedriver versions use cleardriverData
-    time.sleep(2)
+    WebDriverWait(driver, timeout).until(lambda d: d.execute_script("return document.readyState === 'complete' && !!document.querySelector('settings-ui');"))
     actions = ActionChains(driver) 
     actions.send_keys(Keys.TAB * 3 + Keys.DOWN * 3) # send right combination
     actions.perform()
-    time.sleep(2)
     actions = ActionChains(driver) 
     actions.send_keys(Keys.TAB * 4 + Keys.ENTER) # confirm
     actions.perform()
-    time.sleep(5) # wait some time to finish
+    # the dialog closes and the page leaves clearBrowserData when the data is cleared
+    WebDriverWait(driver, timeout).until(lambda d: 'clearBrowserData' not in d.current_url)
     driver.close() # close this tab
     driver.switch_to.window(driver.window_handles[0]) # switch back
 
 def extractSearchBaiduLinks(logger: Logger, search: str, max_pages: int, proxy: str = '', extract_options: dict = []) -> Iterable[str, str]:
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
 
     browser_timeout: int = extract_options["browser_timeout"] if "browser_timeout" in extract_options else 10
     headless: bool = extract_options["headless"] if "headless" in extract_options else False
     clear_cookies: bool = extract_options["clear_cookies"] if "clear_cookies" in extract_options else True
     clear_cache: bool = extract_options["clear_cache"] if "clear_cache" in extract_options else False
+    browser_pool: BrowserPool = extract_options["browser_pool"] if "browser_pool" in extract_options else None
+    # the proxy came from proxy_pool, how it did is reported back when the search ends
+    proxy_pool: ProxyPool = extract_options["proxy_pool"] if "proxy_pool" in extract_options else None
+    metrics: Metrics = extract_options["metrics"] if "metrics" in extract_options else None
+    baidu_url: str = extract_options["baidu_url"] if "baidu_url" in extract_options else BAIDU_URL
+    baidu_link_set: set[str] = extract_options["baidu_link_set"] if "baidu_link_set" in extract_options else set()
+    page_depth = PageDepth(baidu_link_set, max_pages, extract_options)
 
     page_links = []
 
     pn = ''
 
-    options = webdriver.ChromeOptions()
-    
-    if headless:
-        options.add_argument('--headless')
-    if proxy:
-        options.add_argument(f"--proxy-server={proxy}")
-
-    options.add_experimental_option("prefs", {"profile. Managed_default_content_settings. Images": 2})
-    options.add_experimental_option('excludeSwitches', ['enable automation '])
-
-    browser = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-
-    if clear_cookies:
-        browser.delete_all_cookies()
-    
-    if clear_cache:
-        delete_cache(browser)
-        url = 'https://www.baidu.com/'
-        browser.get(url)
-        time.sleep(2)
-        kw = browser.find_element(by=By.XPATH, value="//input[@id='kw']")
-        kw.send_keys(search)
-        time.sleep(2)
-        su = browser.find_element(by=By.XPATH, value="//input[@id='su']")
-        su.click()
-    
-    browser.implicitly_wait(2)
-
-    url = 'https://www.baidu.com/s?wd=' + quote(search)
+    pages_ready = 0
+    links_found = 0
+    latency = 0.0
+    not_found = False
+    closed = False
+    failed = False
+    failure = None
     try:
-        browser.get(url)
-    except TimeoutException:
-        logger.warn("Loading took too much time!")
-        return
-
-    time.sleep(2)
-
-    current_page = 0
+        if browser_pool is not None:
+            session = browser_pool.lease(proxy)
+            browser = session.browser
+        else:
+            session = None
+            launch_started = time.monotonic()
+            browser = createChromeBrowser(proxy, {"headless": headless})
+            if metrics is not None:
+                metrics.observe("browser_launch_seconds", time.monotonic() - launch_started)
+    except Exception as e:
+        if proxy_pool is not None:
+            proxy_pool.failure(proxy, f"{type(e).__name__}: {e}")
+        raise
 
-    while True:
-        page_ready = False
+    try:
+        if clear_cookies:
+            browser.delete_all_cookies()
+        
+        if clear_cache:
+            delete_cache(browser)
+            url = baidu_url + '/'
+            browser.get(url)
+            kw = WebDriverWait(browser, browser_timeout).until(EC.element_to_be_clickable((By.XPATH, "//input[@id='kw']")))
+            kw.send_keys(search)
+            su = WebDriverWait(browser, browser_timeout).until(EC.element_to_be_clickable((By.XPATH, "//input[@id='su']")))
+            su.click()
         
+        browser.implicitly_wait(2)
+
+        url = baidu_url + '/s?wd=' + quote(search)
+        started = time.monotonic()
         try:
-            WebDriverWait(browser, 5).until(EC.presence_of_element_located((By.CLASS_NAME, 'nors')))
-            page_ready = True
-            logger.debug(f"'{search}' not found!")
+            browser.get(url)
         except TimeoutException:
-            # logger.warn("Loading took too much time!")
+            logger.warn("Loading took too much time!")
+            failure = "timeout"
+            if metrics is not None:
+                metrics.inc("baidu_page_timeouts_total", {"engine": "browser"})
+            return
+
+        current_page = 0
+
+        while True:
             logger.debug(f"Loading page  {current_page+1} for '{search}'...")
-        
-        if not page_ready:
-            try:
-                WebDriverWait(browser, browser_timeout).until(EC.presence_of_element_located((By.ID, 'page')))
-                page_ready = True
+            page_state = waitPageState(browser, browser_timeout)
+
+            if page_state == 'not_found':
+                not_found = True
+                if metrics is not None:
+                    metrics.inc("baidu_not_found_total", {"engine": "browser"})
+                logger.debug(f"'{search}' not found!")
+            elif page_state == 'captcha':
+                logger.warning(f"captcha page for '{search}': '{browser.current_url}'")
+                failure = "captcha"
+                if metrics is not None:
+                    metrics.inc("baidu_captchas_total", {"engine": "browser"})
+                break
+            elif page_state != 'results':
+                logger.warn("Loading took too much time!" if page_state == 'timeout' else f"Failed to load page {current_page+1} for '{search}'")
+                if metrics is not None:
+                    metrics.inc("baidu_page_timeouts_total" if page_state == 'timeout' else "baidu_page_errors_total", {"engine": "browser"})
+            else:
                 logger.debug(f"Page {current_page+1} is ready!")
-            except TimeoutException:
-                logger.warn("Loading took too much time!")
-            if page_ready:
+                page_latency = time.monotonic() - started
+                pages_ready += 1
+                latency += page_latency
+                if metrics is not None:
+                    metrics.inc("baidu_pages_loaded_total", {"engine": "browser"})
+                    metrics.observe("baidu_page_load_seconds", page_latency, {"engine": "browser"})
                 url_links = []
                 next_pn = parsePage(browser, logger, pn, url_links, page_links)
+                links_found += len(url_links)
+                page_depth.addPage(url_links)
                 for link in url_links:
                     yield (link, pn)
                 pn = next_pn
 
-        next_page = True
-
-        while next_page:
-            if current_page >= len(page_links):
-                next_page = False
+            next_page = True
+
+            while next_page:
+                if current_page >= len(page_links):
+                    next_page = False
+                    break
+                current_page += 1
+                if not page_depth.nextPage(current_page):
+                    if page_depth.stopped:
+                        logger.info(f"no new links on the last {page_depth.stale} pages of '{search}', stopped after {current_page} pages")
+                        if metrics is not None:
+                            metrics.inc("baidu_early_stops_total", {"engine": "browser"})
+                    next_page = False
+                    break
+                # page links always point to www.baidu.com, follow them on the configured baidu_url
+                url = baidu_url + page_links[current_page-1][len(BAIDU_URL):]
+                started = time.monotonic()
+                try:
+                    browser.get(url)
+                    break
+                except TimeoutException:
+                    logger.warn("Loading took too much time!")            
+
+            if not next_page:
                 break
-            current_page += 1
-            if current_page >= max_pages:
-                next_page = False
-                break
-            url = page_links[current_page-1]
-            try:
-                browser.get(url)
-                break
-            except TimeoutException:
-                logger.warn("Loading took too much time!")            
-
-        if not next_page:
-            break
-
-    browser.close()
-    browser.quit()
-
-def saveBaiduLinks(baidu_link_list: list[str, str, str], filepath: str, inurl: bool = False):
-    with open(filepath, "w", newline='') as fp:
-        writer = csv.writer(fp, quoting=csv.QUOTE_ALL)
-        for link, search, pn in baidu_link_list:
-            writer.writerow([link, search, pn, "inurl" if inurl else ''])
-
-def loadBaiduLinks(filepath: str) -> Iterable[str, str, str, bool]:
-    with open(filepath, "r") as fp:
-        reader = csv.reader(fp)
-        #for link in fp:
-        for row in reader:
-            link = row[0]
-            search = row[1] if len(row) > 1 else ''
-            pn = row[2] if len(row) > 2 else ''
-            inurl = "inurl" == row[3] if len(row) > 3 else False
-            yield link.strip(), search.strip(), pn.strip(), inurl
-
-async def fetch(logger: Logger, url: str, reject_patterns: list[Pattern], options: dict = []):
+    except GeneratorExit:
+        closed = True
+        raise
+    except Exception as e:
+        failed = True
+        failure = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if session is not None:
+            browser_pool.release(session, failed)
+        else:
+            browser.quit()
+        if proxy_pool is not None:
+            if failure == "captcha":
+                proxy_pool.captcha(proxy)
+            elif failure is not None:
+                proxy_pool.failure(proxy, failure)
+            elif links_found:
+                proxy_pool.success(proxy, latency / pages_ready)
+            elif closed:
+                proxy_pool.release(proxy)
+            elif pages_ready:
+                proxy_pool.empty(proxy, latency / pages_ready)
+            elif not_found:
+                proxy_pool.empty(proxy)
+            else:
+                proxy_pool.failure(proxy, "timeout")
+
+def saveBaiduLinks(baidu_link_list: list[str, str, str], filepath: str, inurl: bool = False, output_format: str = "csv"):
+    with ExtractedLinksSink(filepath, inurl, {"output_format": output_format}) as sink:
+        for baidu_link in baidu_link_list:
+            sink.write(baidu_link)
+
+def loadBaiduLinks(filepath: str, output_format: str = "csv") -> Iterable[str, str, str, bool]:
+    # filepath is the name of the csv file, other formats are read from the file with their extension
+    for record in loadRecords(filepath, output_format, None, OUTPUT_COLUMNS["baidu_extracted_links.csv"]):
+        link = record["link"]
+        search = record.get("search") or ''
+        pn = record.get("pn") or ''
+        inurl = record.get("inurl") in [True, "inurl"]
+        yield link.strip(), search.strip(), pn.strip(), inurl
+
+def createLinkSession(options: dict = []) -> ClientSession:
+    from aiohttp import ClientSession, ClientTimeout, TCPConnector
+    fetch_timeout: int = options["fetch_timeout"] if "fetch_timeout" in options else 15
+    limit_per_host: int = options["limit_per_host"] if "limit_per_host" in options else 0
+    dns_cache_ttl: int = options["dns_cache_ttl"] if "dns_cache_ttl" in options else 300
+    keepalive_timeout: float = options["keepalive_timeout"] if "keepalive_timeout" in options else 30
+    session_timeout = ClientTimeout(total=None, sock_connect=fetch_timeout, sock_read=fetch_timeout)
+    connector = TCPConnector(limit_per_host=limit_per_host, ttl_dns_cache=dns_cache_ttl, keepalive_timeout=keepalive_timeout)
+    return ClientSession(connector=connector, timeout=session_timeout)
+
+async def fetch_redirect(session: ClientSession, url: str, proxy: str = '') -> tuple[int, str]:
+    async with session.get(url, allow_redirects=False, proxy=f"http://{proxy}" if proxy else None) as response:
+        status = response.status
+        location = response.headers.get('location')
+        # the body is never needed, give the connection back to the pool right away
+        response.release()
+    return status, location
+
+def classifyRedirect(logger: Logger, url: str, status: int, location: str, reject_patterns: list[Pattern], options: dict = []):
     inurl_filter: bool = options["inurl_filter"] if "inurl_filter" in options else False
     indomain_filter: bool = options["indomain_filter"] if "indomain_filter" in options else False
     search: str = options["search"] if "search" in options else ''
-    timeout_seconds: int = options["fetch_timeout"] if "fetch_timeout" in options else  15
+    if status == 200:
+        msg = f"status: {status}, not a redirect"
+        logger.debug(f"rejected URL: '{url}', {msg}")
+        return (url, "REJECTED", msg)
+    if status not in [301, 302]:
+        msg = f"status: {status}, bad status"
+        logger.debug(f"failed URL: '{url}', {msg}")
+        return (url, "FAILED", msg)
+    if location is None:
+        msg = f"status: {status}, no location"
+        logger.debug(f"rejected URL: '{url}', {msg}")
+        return (url, "REJECTED", msg)
+    if not location:
+        msg = f"status: {status}, empty location"
+        logger.debug(f"rejected URL: '{url}', {msg}")
+        return (url, "REJECTED", msg)
+    for p in reject_patterns:
+        if p.search(location):
+            msg = f"status: {status}, rejected location: '{location}'"
+            logger.debug(f"rejected URL: '{url}', {msg}")
+            return (url, "REJECTED", msg)
+    locationURL = urlparse(location)
+    host = locationURL.netloc
+    if indomain_filter:
+        if (not search) or (search.lower() not in host.lower()):
+            msg = f"status: {status}, `{search}` is not in domain: '{host}', location: '{location}'"
+            logger.debug(f"rejected URL: '{url}', {msg}")
+            return (url, "REJECTED", msg)
+    if inurl_filter:
+        if (not search) or (search.lower() not in location.lower()):
+            msg = f"status: {status}, `{search}` is not in url: '{location}'"
+            logger.debug(f"rejected URL: '{url}', {msg}")
+            return (url, "REJECTED", msg)
+    logger.debug(f"redirect URL: '{url}', status: {status}, location: '{location}'")
+    return (url, "OK", {"host": host, "location": location})
+
+async def fetch(logger: Logger, url: str, reject_patterns: list[Pattern], options: dict = []):
+    session: ClientSession = options["session"] if "session" in options else None
+    link_cache: LinkCache = options["link_cache"] if "link_cache" in options else None
+    limiter: AdaptiveLimiter = options["limiter"] if "limiter" in options else None
+    proxy_pool: ProxyPool = options["proxy_pool"] if "proxy_pool" in options else None
+    metrics: Metrics = options["metrics"] if "metrics" in options else None
+    if link_cache is not None:
+        cached = link_cache.get(url)
+        if cached is not None:
+            status, location = cached
+            logger.debug(f"cached URL: '{url}'")
+            if metrics is not None:
+                metrics.inc("link_cache_hits_total")
+            return classifyRedirect(logger, url, status, location, reject_patterns, options)
+    target = urlparse(url).netloc
+    started = await limiter.acquire(target) if limiter is not None else None
+    proxy = proxy_pool.acquire() if proxy_pool is not None else ''
+    started_at = time.monotonic()
+    status = None
+    location = None
+    answered = False
+    throttle = None
+    failure = None
     try:
-        session_timeout = ClientTimeout(total=None, sock_connect=timeout_seconds, sock_read=timeout_seconds)    
-        async with ClientSession(timeout=session_timeout) as session:
-            async with session.get(url, allow_redirects=False) as response:                
-                if response.status == 200:
-                    msg = f"status: {response.status}, not a redirect"
-                    logger.debug(f"rejected URL: '{url}', {msg}")
-                    return (url, "REJECTED", msg)
-                if response.status not in [301, 302]:
-                    msg = f"status: {response.status}, bad status"
-                    logger.debug(f"failed URL: '{url}', {msg}")
-                    return (url, "FAILED", msg)
-                if 'location' not in response.headers:
-                    msg = f"status: {response.status}, no location"
-                    logger.debug(f"rejected URL: '{url}', {msg}")
-                    return (url, "REJECTED", msg)
-                location = response.headers['location']
-                if not location:
-                    msg = f"status: {response.status}, empty location"
-                    logger.debug(f"rejected URL: '{url}', {msg}")
-                    return (url, "REJECTED", msg)
-                for p in reject_patterns:
-                    if p.search(location):
-                        msg = f"status: {response.status}, rejected location: '{location}'"
-                        logger.debug(f"rejected URL: '{url}', {msg}")
-                        return (url, "REJECTED", msg)
-                locationURL = urlparse(location)
-                host = locationURL.netloc
-                if indomain_filter:
-                    if (not search) or (search.lower() not in host.lower()):
-                        msg = f"status: {response.status}, `{search}` is not in domain: '{host}', location: '{location}'"
-                        logger.debug(f"rejected URL: '{url}', {msg}")
-                        return (url, "REJECTED", msg)
-                if inurl_filter:
-                    if (not search) or (search.lower() not in location.lower()):
-                        msg = f"status: {response.status}, `{search}` is not in url: '{location}'"
-                        logger.debug(f"rejected URL: '{url}', {msg}")
-                        return (url, "REJECTED", msg)
-                logger.debug(f"redirect URL: '{url}', status: {response.status}, location: '{location}'")
-                return (url, "OK", {"host": host, "location": location})
+        if session is None:
+            async with createLinkSession(options) as own_session:
+                status, location = await fetch_redirect(own_session, url, proxy)
+        else:
+            status, location = await fetch_redirect(session, url, proxy)
+        if status in [429, 503]:
+            throttle = f"status: {status}"
+        else:
+            answered = True
+        # only definite answers are cached, other statuses may be temporary
+        if link_cache is not None and status in [200, 301, 302]:
+            link_cache.put(url, status, location)
     except Exception as e:
         msg = str(e)
         if (msg):
             msg = type(e).__name__ + ": " + msg
         else:
             msg = type(e).__name__
+        if isThrottleError(e):
+            throttle = msg
+        failure = msg
         logger.debug(f"failed to get URL '{url}': {msg}")
         return (url, "FAILED", msg)
-
-def checkBaiduLinks(logger: Logger, baidu_links: list[str or tuple[str, ...]], reject_patterns: list[Pattern], parallel_tasks: int, loop: asyncio.AbstractEventLoop, options: dict =  []) -> Iterable[str, str, str]:
+    finally:
+        if limiter is not None:
+            if throttle is not None:
+                limiter.throttled(target, started, throttle)
+            elif answered:
+                limiter.success(target)
+            else:
+                limiter.failure(target)
+        if proxy_pool is not None:
+            if location is not None and isBaiduCaptchaUrl(location, url):
+                proxy_pool.captcha(proxy)
+            elif answered:
+                proxy_pool.success(proxy, time.monotonic() - started_at)
+            elif throttle is not None or failure is not None:
+                proxy_pool.failure(proxy, throttle or failure)
+            else:
+                proxy_pool.release(proxy)
+        if metrics is not None and (status is not None or failure is not None):
+            metrics.observe("link_fetch_seconds", time.monotonic() - started_at, {"status": status if status is not None else "FAILED"})
+    return classifyRedirect(logger, url, status, location, reject_patterns, options)
+
+def iterate_async(loop: asyncio.AbstractEventLoop, agen: AsyncIterator) -> Iterable:
+    # runs an async generator on `loop`, or on a loop of its own if `loop` is None;
+    # must not be called from a running loop, use `async for` there
+    own_loop = loop is None
+    if own_loop:
+        loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(agen.aclose())
+        if own_loop:
+            loop.close()
+
+async def sliding_window(aws: Iterable[Awaitable] or AsyncIterator[Awaitable], limit: int, ordered: bool = False) -> AsyncIterator:
+    # keeps exactly `limit` awaitables in flight and yields results as they complete,
+    # or in input order if `ordered`; awaitables are pulled from `aws` only when a slot is free
+    limit = max(1, limit)
+    source = aws.__aiter__() if hasattr(aws, '__aiter__') else None
+    it = iter(aws) if source is None else None
+    running = {}
+    results = {}
+    next_index = 0
+    next_yield = 0
+    source_task = None
+    exhausted = False
+    try:
+        while True:
+            while it is not None and not exhausted and len(running) < limit:
+                aw = next(it, None)
+                if aw is None:
+                    exhausted = True
+                else:
+                    running[asyncio.ensure_future(aw)] = next_index
+                    next_index += 1
+            if source is not None and not exhausted and source_task is None and len(running) < limit:
+                source_task = asyncio.ensure_future(source.__anext__())
+            wait_set = set(running)
+            if source_task is not None:
+                wait_set.add(source_task)
+            if not wait_set:
+                break
+            done, _ = await asyncio.wait(wait_set, return_when=asyncio.FIRST_COMPLETED)
+            if source_task in done:
+                done.discard(source_task)
+                try:
+                    running[asyncio.ensure_future(source_task.result())] = next_index
+                    next_index += 1
+                except StopAsyncIteration:
+                    exhausted = True
+                source_task = None
+            for task in sorted(done, key=running.get):
+                index = running.pop(task)
+                if ordered:
+                    results[index] = task.result()
+                else:
+                    yield task.result()
+            while next_yield in results:
+                yield results.pop(next_yield)
+                next_yield += 1
+    finally:
+        pending = list(running)
+        if source_task is not None:
+            pending.append(source_task)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+async def aioCheckBaiduLinks(logger: Logger, baidu_links: Iterable[str or tuple[str, ...]] or AsyncIterator[str or tuple[str, ...]], reject_patterns: list[Pattern], parallel_tasks: int, options: dict = []) -> AsyncIterator[tuple[str, str, str]]:
+    # resolves the links on the running loop; baidu_links may be an async iterator,
+    # links are taken from it only when one of the parallel_tasks slots is free
     inurl_filter: bool = options["inurl_filter"] if "inurl_filter" in options else False
     indomain_filter: bool = options["indomain_filter"] if "indomain_filter" in options else False
-    fetch_timeout: int = options["fetch_timeout"] if "fetch_timeout" in options else 15
-    tasks = []
-    for row in baidu_links:
+    ordered: bool = options["ordered"] if "ordered" in options else False
+    link_cache: LinkCache = options["link_cache"] if "link_cache" in options else None
+    limiter: AdaptiveLimiter = options["limiter"] if "limiter" in options else None
+    proxy_pool: ProxyPool = options["proxy_pool"] if "proxy_pool" in options else None
+    metrics: Metrics = options["metrics"] if "metrics" in options else None
+    # one session for all links: keep-alive, TLS session reuse and DNS cache for www.baidu.com
+    session = createLinkSession(options)
+    def fetch_task(row):
         link = row[0] if type(row) is tuple else row
         search = row[1] if type(row) is tuple and len(row) > 1 else ''
-        task = asyncio.ensure_future(fetch(logger, link, reject_patterns, {
+        return fetch(logger, link, reject_patterns, {
             "inurl_filter": inurl_filter,
             "indomain_filter": indomain_filter,
             "search": search,
-            "timeout": fetch_timeout
-        }))
-        tasks.append(task)
-        if len(tasks) >= parallel_tasks:
-            responses = loop.run_until_complete(asyncio.gather(*tasks))
-            tasks = []
-            for requestURL, responseStatus, responseResult in responses:
-                yield (requestURL,responseStatus,responseResult)
-    if len(tasks) > 0:
-        responses = loop.run_until_complete(asyncio.gather(*tasks))
-        for requestURL, responseStatus, responseResult in responses:
+            "session": session,
+            "link_cache": link_cache,
+            "limiter": limiter,
+            "proxy_pool": proxy_pool,
+            "metrics": metrics
+        })
+    if hasattr(baidu_links, '__aiter__'):
+        async def fetch_tasks():
+            async for row in baidu_links:
+                yield fetch_task(row)
+    else:
+        def fetch_tasks():
+            for row in baidu_links:
+                yield fetch_task(row)
+    try:
+        async for requestURL, responseStatus, responseResult in sliding_window(fetch_tasks(), parallel_tasks, ordered):
             yield (requestURL,responseStatus,responseResult)
-
-def saveBaiduCheckedLinks(baidu_links_checked: list[tuple[str, str, str]], dir: str):
-    with open(os.path.join(dir, "baidu_links_success.csv"), "w", newline='') as fp:
-        writer = csv.writer(fp, quoting=csv.QUOTE_ALL)
-        for requestURL, responseStatus, responseResult in baidu_links_checked:
-            if responseStatus == 'OK':
-                writer.writerow([requestURL,responseResult['host'],responseResult['location']])
-    with open(os.path.join(dir, "baidu_links_failed.csv"), "w", newline='') as fp:
-        writer = csv.writer(fp, quoting=csv.QUOTE_ALL)
-        for requestURL, responseStatus, responseResult in baidu_links_checked:
-            if responseStatus == 'FAILED':
-                writer.writerow([requestURL,responseResult])
-    with open(os.path.join(dir, "baidu_links_empty.csv"), "w", newline='') as fp:
-        writer = csv.writer(fp, quoting=csv.QUOTE_ALL)
-        for requestURL, responseStatus, responseResult in baidu_links_checked:
-            if responseStatus == 'EMPTY':
-                writer.writerow([requestURL,responseResult])
-    with open(os.path.join(dir, "baidu_links_rejected.csv"), "w", newline='') as fp:
-        writer = csv.writer(fp, quoting=csv.QUOTE_ALL)
-        for requestURL, responseStatus, responseResult in baidu_links_checked:
-            if responseStatus == 'REJECTED':
-                writer.writerow([requestURL,responseResult])
-    with open(os.path.join(dir, "baidu_links_other.csv"), "w", newline='') as fp:
-        writer = csv.writer(fp, quoting=csv.QUOTE_ALL)
-        for requestURL, responseStatus, responseResult in baidu_links_checked:
-            if responseStatus not in ['OK','FAILED','EMPTY','REJECTED']:
-                writer.writerow([requestURL,responseStatus,responseResult])
+    finally:
+        await session.close()
+
+def checkBaiduLinks(logger: Logger, baidu_links: list[str or tuple[str, ...]], reject_patterns: list[Pattern], parallel_tasks: int, loop: asyncio.AbstractEventLoop = None, options: dict =  []) -> Iterable[str, str, str]:
+    # aioCheckBaiduLinks on `loop`, or on a loop of its own if `loop` is None
+    yield from iterate_async(loop, aioCheckBaiduLinks(logger, baidu_links, reject_patterns, parallel_tasks, options))
+
+def saveBaiduCheckedLinks(baidu_links_checked: list[tuple[str, str, str]], dir: str, options: dict = []):
+    with CheckedLinksSink(dir, options) as sink:
+        for checked_link in baidu_links_checked:
+            sink.write(checked_link)
+
+def loadBaiduCheckedHosts(dir: str, output_format: str = "csv") -> Iterable[str]:
+    # only the host column is read
+    for record in loadRecords(os.path.join(dir, "baidu_links_success.csv"), output_format, ["host"]):
+        host = (record.get("host") or '').strip()
+        if host:
+            yield host
 
 def getHostsFromCheckedBaiduLinks(baidu_links_checked) -> list[str]:
     hosts = set()
@@ -313,38 +554,87 @@ def loadBaiduTargetHosts(filepath: str) -> Iterable[str]:
         for line in fp:
             yield line.strip()
 
-async def whois_lookup(logger: Logger, host: str, whois_timeout: int = 15):
+expires_re = re.compile(r"(?im)(expiry|expiration)[ \t](date|time):[ \t]?([0-9T:+-]+Z?)")
+
+def parseWhoisOutput(whois_output: str) -> tuple[str, datetime, list[str]]:
+    expires_str = ''
+    expires = None
+    m = expires_re.search(whois_output)
+    if m:
+        import dateutil.parser
+        expires_str = m.group(3)
+        expires = dateutil.parser.parse(expires_str)
+    query_output = [line.strip() for line in whois_output.split('\n')]
+    return expires_str, expires, query_output
+
+def whoisTarget(domain: str) -> str:
+    # whois servers are per TLD
+    return '.' + domain.rsplit('.', 1)[-1]
+
+not_found_re = re.compile(r"(?im)^\s*(no match|not found|no data found|no entries found|domain not found)")
+
+class NotFoundError(Exception):
+    # the domain is not registered, asyncwhois.errors.NotFoundError is raised as this one
+    pass
+
+async def queryWhoisServer(server: str, domain: str, whois_timeout: int = 15) -> str:
+    # a plain port 43 query to one server ("host" or "host:port"), without referrals
+    host, _, port = server.partition(':')
+    async def query():
+        reader, writer = await asyncio.open_connection(host, int(port or 43))
+        try:
+            writer.write(domain.encode('idna') + b"\r\n")
+            await writer.drain()
+            return (await reader.read()).decode('utf8', errors='replace')
+        finally:
+            writer.close()
+    return await asyncio.wait_for(query(), whois_timeout)
+
+async def whois_lookup(logger: Logger, host: str, whois_timeout: int = 15, limiter: AdaptiveLimiter = None, metrics: Metrics = None, whois_server: str = None):
+    target = whoisTarget(host)
+    started = await limiter.acquire(target) if limiter is not None else None
+    started_at = time.monotonic()
+    answered = False
+    throttle = None
+    outcome = None
     try:
-        whois_result = await asyncwhois.aio_whois_domain(domain=host, timeout=whois_timeout)
-        logger.debug(whois_result.query_output)
-        if whois_result.query_output is None:
+        if whois_server:
+            whois_output = await queryWhoisServer(whois_server, host, whois_timeout)
+            answered = True
+            if not_found_re.search(whois_output):
+                raise NotFoundError(f"{host} not found on {whois_server}")
+        else:
+            import asyncwhois
+            import asyncwhois.errors
+            try:
+                whois_result = await asyncwhois.aio_whois_domain(domain=host, timeout=whois_timeout)
+            except asyncwhois.errors.NotFoundError as e:
+                raise NotFoundError(str(e)) from e
+            answered = True
+            whois_output = whois_result.query_output
+        logger.debug(whois_output)
+        if whois_output is None:
             logger.debug(f"no whois response for '{host}'")
+            outcome = 'FAILED'
             return (host, 'FAILED', 'query_output is None')
-        expires_str = ''
-        expires = None
-        expires_re = re.compile(r"(?i)(expiry|expiration)\s(date|time):\s?([0-9T:+-]+Z?)")
-        query_output = []
-        for line in str(whois_result.query_output or '').split('\n'):
-            line = line.strip()
-            if expires is None:
-                m = expires_re.search(line)
-                if m:
-                    expires_str = m.group(3)
-                    expires = dateutil.parser.parse(expires_str)
-            query_output.append(line)
+        # large responses are parsed on a worker thread, so they don't block other lookups
+        expires_str, expires, query_output = await asyncio.to_thread(parseWhoisOutput, str(whois_output or ''))
         '''
         if whois_result.parser_output is None:
             logger.debug(f"unable parse whois for '{host}'")
             return (host, 'FAILED', 'parser_output is None')
         '''
+        outcome = 'OK' if expires is not None else 'NO_EXPIRES'
         return (host, 'OK', {"expires_str":expires_str,"expires":expires,"query_output":query_output})
     except NotFoundError as e:
+        answered = True
         msg = str(e)
         if (msg):
             msg = type(e).__name__ + ": " + msg
         else:
             msg = type(e).__name__
         logger.debug(f"whois not found for '{host}', {msg}")
+        outcome = 'NOT_FOUND'
         return (host, 'NOT_FOUND', str(e))
     except Exception as e:
         msg = str(e)
@@ -352,72 +642,63 @@ async def whois_lookup(logger: Logger, host: str, whois_timeout: int = 15):
             msg = type(e).__name__ + ": " + msg
         else:
             msg = type(e).__name__
+        if not answered and isThrottleError(e):
+            throttle = msg
         logger.debug(f"whois failed for '{host}', {msg}")
+        outcome = 'THROTTLED' if throttle is not None else 'FAILED'
         return (host, 'FAILED', msg)
-
-def getWhoisForHosts(logger: Logger, host_list: list[str], parallel_tasks: int, loop: asyncio.AbstractEventLoop, whois_timeout: int = 15) -> Iterable[str, str, str]:
-    tasks = []
+    finally:
+        if metrics is not None and outcome is not None:
+            metrics.observe("whois_lookup_seconds", time.monotonic() - started_at, {"outcome": outcome})
+        if limiter is not None:
+            if throttle is not None:
+                limiter.throttled(target, started, throttle)
+            elif answered:
+                limiter.success(target)
+            else:
+                limiter.failure(target)
+
+def groupHostsByDomain(host_list: Iterable[str], public_suffix_list: PublicSuffixList) -> dict[str, list[str]]:
+    domain_hosts = {}
     for host in host_list:
-        logger.debug(f"Checking whois for {host}")
-        '''
-        w = whois.whois(host)
-        logger.debug(f"whois for {host}:\n\n{w}")
-        '''
-        task = asyncio.ensure_future(whois_lookup(logger, host, whois_timeout))
-        tasks.append(task)
-        if len(tasks) >= parallel_tasks:
-            responses = loop.run_until_complete(asyncio.gather(*tasks))
-            for host, status, whois_result in responses:
-                yield (host, status, whois_result)
-            tasks = []    
-    if len(tasks) > 0:
-        responses = loop.run_until_complete(asyncio.gather(*tasks))
-        for host, status, whois_result in responses:
+        domain_hosts.setdefault(public_suffix_list.registrableDomain(host), []).append(host)
+    return domain_hosts
+
+async def aioGetWhoisForHosts(logger: Logger, host_list: list[str], parallel_tasks: int, whois_timeout: int = 15, options: dict = []) -> AsyncIterator[tuple[str, str, str]]:
+    # queries whois on the running loop
+    ordered: bool = options["ordered"] if "ordered" in options else False
+    limiter: AdaptiveLimiter = options["limiter"] if "limiter" in options else None
+    metrics: Metrics = options["metrics"] if "metrics" in options else None
+    whois_server: str = options["whois_server"] if "whois_server" in options else None
+    # with a public suffix list, whois is queried once per registrable domain
+    # and the result is reported for every host of the domain
+    public_suffix_list: PublicSuffixList = options["public_suffix_list"] if "public_suffix_list" in options else None
+    if public_suffix_list is not None:
+        domain_hosts = groupHostsByDomain(host_list, public_suffix_list)
+    else:
+        domain_hosts = {host: [host] for host in host_list}
+    def whois_tasks():
+        for domain in domain_hosts:
+            logger.debug(f"Checking whois for {domain}")
+            '''
+            w = whois.whois(host)
+            logger.debug(f"whois for {host}:\n\n{w}")
+            '''
+            yield whois_lookup(logger, domain, whois_timeout, limiter, metrics, whois_server)
+    async for domain, status, whois_result in sliding_window(whois_tasks(), parallel_tasks, ordered):
+        for host in domain_hosts[domain]:
             yield (host, status, whois_result)
 
-def saveWhoisForHosts(logger: Logger, whois_info_list, whois_not_expired: list[str or tuple[str, ...]], dir: str):
-    now_timestamp =  datetime.timestamp(datetime.now())
-    not_expired = []
-    with open(os.path.join(dir, "baidu_whois_expired.csv"), "w", newline='') as fp:
-        writer = csv.writer(fp, quoting=csv.QUOTE_ALL)
-        for host, status, whois_result in whois_info_list:
-            expired = False
-            if status == 'OK':
-                if whois_result['expires'] is not None:
-                    if datetime.timestamp(whois_result['expires']) <= now_timestamp:
-                        expired = True
-                        writer.writerow([host,whois_result['expires'].isoformat(),whois_result['expires_str'],str(whois_result['query_output']).encode("utf8")])
-                else:
-                    logger.debug(f"no 'expires' info in whois for '{host}'")
-                    status = 'NO_EXPIRES'
-            if not expired:
-                not_expired.append((host, status, whois_result))
-    with open(os.path.join(dir, "baidu_whois_not_found.csv"), "w", newline='') as fp:
-        writer = csv.writer(fp, quoting=csv.QUOTE_ALL)
-        for host, status, whois_result in not_expired:
-            if status == 'NOT_FOUND':
-                writer.writerow([host,whois_result.encode("utf8")])
-    with open(os.path.join(dir, "baidu_whois_failed.csv"), "w", newline='') as fp:
-        writer = csv.writer(fp, quoting=csv.QUOTE_ALL)
-        for host, status, whois_result in not_expired:
-            if status == 'FAILED':
-                writer.writerow([host,whois_result.encode("utf8")])
-    with open(os.path.join(dir, "baidu_whois_no_expires.csv"), "w", newline='') as fp:
-        writer = csv.writer(fp, quoting=csv.QUOTE_ALL)
-        for host, status, whois_result in not_expired:
-            if status == 'NO_EXPIRES':
-                writer.writerow([host,status,whois_result['expires_str'],str(whois_result['query_output']).encode("utf8")])
-    with open(os.path.join(dir, "baidu_whois_not_expired.csv"), "w", newline='') as fp:
-        writer = csv.writer(fp, quoting=csv.QUOTE_ALL)
-        for row in whois_not_expired:
-            writer.writerow(row)
-        for host, status, whois_result in not_expired:
-            if status == 'OK':
-                writer.writerow([host,status,whois_result['expires'].isoformat(),whois_result['expires_str'],str(whois_result['query_output']).encode("utf8")])
-            elif status not in ['NOT_FOUND', 'FAILED', 'NO_EXPIRES']:
-                writer.writerow([host,status,whois_result.encode("utf8")])
-
-def filterWhoisHosts(host_list: list[str], whois_not_expired: list[str or tuple[str, ...]], dir: str) -> Iterable[str]:
+def getWhoisForHosts(logger: Logger, host_list: list[str], parallel_tasks: int, loop: asyncio.AbstractEventLoop = None, whois_timeout: int = 15, options: dict = []) -> Iterable[str, str, str]:
+    # aioGetWhoisForHosts on `loop`, or on a loop of its own if `loop` is None
+    yield from iterate_async(loop, aioGetWhoisForHosts(logger, host_list, parallel_tasks, whois_timeout, options))
+
+def saveWhoisForHosts(logger: Logger, whois_info_list, whois_not_expired: list[str or tuple[str, ...]], dir: str, options: dict = []):
+    with WhoisSink(logger, dir, whois_not_expired, options) as sink:
+        for whois_info in whois_info_list:
+            sink.write(whois_info)
+
+def loadWhoisExcludeList(dir: str) -> set[str]:
     exclude_hosts = set()
     if os.path.exists(os.path.join(dir, "baidu_whois_exclude.txt")):
         with open(os.path.join(dir, "baidu_whois_exclude.txt"), "r") as fp:
@@ -425,18 +706,24 @@ def filterWhoisHosts(host_list: list[str], whois_not_expired: list[str or tuple[
                 host = line.strip()
                 if host:
                     exclude_hosts.add(host)
-    if (os.path.exists(os.path.join(dir, "baidu_whois_not_expired.csv"))):
-        with open(os.path.join(dir, "baidu_whois_not_expired.csv"), "r") as fp:
-            reader = csv.reader(fp)
-            now_timestamp =  datetime.timestamp(datetime.now())
-            for row in reader:
-                if len(row) > 0:
-                    host = row[0].strip()
-                    if host and len(row) > 2:
-                        expires = datetime.fromisoformat(row[2].strip())
-                        if datetime.timestamp(expires) > now_timestamp:
-                            exclude_hosts.add(host)
-                            whois_not_expired.append(row)
+    return exclude_hosts
+
+def loadWhoisExcludeHosts(whois_not_expired: list[str or tuple[str, ...]], dir: str, output_format: str = "csv") -> set[str]:
+    exclude_hosts = loadWhoisExcludeList(dir)
+    now_timestamp =  datetime.timestamp(datetime.now())
+    for record in loadRecords(os.path.join(dir, "baidu_whois_not_expired.csv"), output_format):
+        row = list(record.values())
+        if len(row) > 0:
+            host = row[0].strip()
+            if host and len(row) > 2 and row[2]:
+                expires = row[2] if isinstance(row[2], datetime) else datetime.fromisoformat(row[2].strip())
+                if datetime.timestamp(expires) > now_timestamp:
+                    exclude_hosts.add(host)
+                    whois_not_expired.append(row)
+    return exclude_hosts
+
+def filterWhoisHosts(host_list: list[str], whois_not_expired: list[str or tuple[str, ...]], dir: str, output_format: str = "csv") -> Iterable[str]:
+    exclude_hosts = loadWhoisExcludeHosts(whois_not_expired, dir, output_format)
     for host in host_list:
         if host and host not in exclude_hosts:
             yield host
@@ -446,23 +733,171 @@ def makeDirs(dirlist: list[str]):
         if not os.path.exists(dir):
             os.makedirs(dir)
 
+def extractBaiduLinksWorker(logger: Logger, proxy_pool: ProxyPool, jobs: Queue, stop_event: threading.Event, max_pages: int, extract_options: dict):
+    while not stop_event.is_set():
+        try:
+            s, result = jobs.get_nowait()
+        except Empty:
+            break
+        if not result.set_running_or_notify_cancel():
+            continue
+        try:
+            result.set_result(list(extractSearchBaiduLinks(logger, s, max_pages, proxy_pool.acquire(), extract_options)))
+        except Exception as e:
+            result.set_exception(e)
+
+def trackSearchProgress(search: str, links: Iterable[tuple[str, str]], options: dict = []) -> Iterable[tuple[str, str]]:
+    # reports a page when its last link has been handled by the consumer, and the keyword when all its pages are
+    on_page_done: Callable = options["on_page_done"] if "on_page_done" in options else None
+    on_keyword_done: Callable = options["on_keyword_done"] if "on_keyword_done" in options else None
+    pn = None
+    for link, page in links:
+        if pn is not None and page != pn and on_page_done is not None:
+            on_page_done(search, pn)
+        pn = page
+        yield (link, page)
+    if pn is not None and on_page_done is not None:
+        on_page_done(search, pn)
+    if on_keyword_done is not None:
+        on_keyword_done(search)
+
+def isNewLink(link: str, baidu_link_set: set[str], dedupe_index: DedupeIndex = None) -> bool:
+    # links of this run are kept exactly, links of earlier runs in the dedupe index;
+    # links of earlier runs go to baidu_link_set as well, so they do not count as new links of a page
+    if link in baidu_link_set:
+        return False
+    baidu_link_set.add(link)
+    return dedupe_index is None or not dedupe_index.seen("link:" + link)
+
+def addDoneLink(dedupe_index: DedupeIndex, link: str, status: str = None):
+    # a link goes to the dedupe index once it is resolved (or extracted, if links are not resolved),
+    # so the links of a run that stopped early are resolved by the next run; failed links are tried again
+    if dedupe_index is not None and status != 'FAILED':
+        dedupe_index.add("link:" + link)
+
+def addCheckedHost(dedupe_index: DedupeIndex, host: str, status: str, whois_result):
+    # only a whois result that holds while the index keeps the host: an expiry date after it is forgotten.
+    # Failed, not found, no expiry date and soon expiring domains are checked again when the whois store says
+    if dedupe_index is None or status != 'OK' or whois_result['expires'] is None:
+        return
+    keeps_until = dedupe_index.keepsUntil()
+    if keeps_until is not None and datetime.timestamp(whois_result['expires']) > keeps_until:
+        dedupe_index.add("host:" + host)
+
+def extractBaiduLinksHttp(logger: Logger, search_list: list[str], max_pages: int, proxy_list: list[str], options: dict = []) -> Iterable[str, str, str]:
+    inurl: bool = options["inurl"] if "inurl" in options else False
+    loop: asyncio.AbstractEventLoop = options["loop"] if "loop" in options else None
+    own_loop = loop is None
+    if own_loop:
+        loop = asyncio.new_event_loop()
+    async def create_session():
+        return createSerpSession(options)
+    session = loop.run_until_complete(create_session())
+    proxy_pool: ProxyPool = options["proxy_pool"] if "proxy_pool" in options else ProxyPool(logger, proxy_list)
+    baidu_link_set: set[str] = options["baidu_link_set"] if "baidu_link_set" in options else set()
+    dedupe_index: DedupeIndex = options["dedupe_index"] if "dedupe_index" in options else None
+    try:
+        for search in search_list:
+            s = "inurl: " + search if inurl else search
+            for link, page in trackSearchProgress(search, iterate_async(loop, aioExtractSearchBaiduLinksHttp(logger, s, max_pages, session, proxy_pool.acquire(), {
+                    **options,
+                    "proxy_pool": proxy_pool,
+                    "baidu_link_set": baidu_link_set
+                })), options):
+                if isNewLink(link, baidu_link_set, dedupe_index):
+                    yield (link, search, page)
+    finally:
+        loop.run_until_complete(session.close())
+        if own_loop:
+            loop.close()
+
 def extractBaiduLinks(logger: Logger, search_list: list[str], max_pages: int, proxy_list: list[str], options: dict = []) -> Iterable[str, str, str]:
+    engine: str = options["engine"] if "engine" in options else "browser"
+    if engine == "http":
+        yield from extractBaiduLinksHttp(logger, search_list, max_pages, proxy_list, options)
+        return
+    if engine != "browser":
+        raise ValueError(f"Bad extract engine: '{engine}'")
     inurl: bool = options["inurl"] if "inurl" in options else False
     browser_timeout: int = options["browser_timeout"] if "browser_timeout" in options else 10
     headless: bool = options["headless"] if "headless" in options else False
     clear_cookies: bool = options["clear_cookies"] if "clear_cookies" in options else True
     clear_cache: bool = options["clear_cache"] if "clear_cache" in options else False
-    proxy_cycle = cycle(proxy_list)
-    baidu_link_set = set()
-    for search in search_list:
-        proxy = next(proxy_cycle, '')
-        s = "inurl: " + search if inurl else search
-        for link, page in extractSearchBaiduLinks(logger, s, max_pages, proxy, {
-                "browser_timeout": browser_timeout,
-                "headless": headless,
-                "clear_cookies": clear_cookies,
-                "clear_cache": clear_cache
-            }):
-            if not link in baidu_link_set:
-                baidu_link_set.add(link)
-                yield (link, search, page)
+    baidu_url: str = options["baidu_url"] if "baidu_url" in options else BAIDU_URL
+    browser_max_uses: int = options["browser_max_uses"] if "browser_max_uses" in options else 50
+    parallel_browsers: int = options["parallel_browsers"] if "parallel_browsers" in options else 1
+    browser_pool_size: int = options["browser_pool_size"] if "browser_pool_size" in options else max(1, len(proxy_list), parallel_browsers)
+    browser_pool: BrowserPool = options["browser_pool"] if "browser_pool" in options else None
+    proxy_pool: ProxyPool = options["proxy_pool"] if "proxy_pool" in options else ProxyPool(logger, proxy_list)
+    metrics: Metrics = options["metrics"] if "metrics" in options else None
+    own_pool = browser_pool is None
+    if own_pool:
+        # one warm browser per proxy by default, so a proxy keeps its browser between searches
+        browser_pool = BrowserPool(logger, browser_pool_size, proxy_list, {
+            "headless": headless,
+            "max_uses": browser_max_uses,
+            "metrics": metrics
+        })
+    extract_options = {
+        "browser_timeout": browser_timeout,
+        "headless": headless,
+        "clear_cookies": clear_cookies,
+        "clear_cache": clear_cache,
+        "baidu_url": baidu_url,
+        "browser_pool": browser_pool,
+        "proxy_pool": proxy_pool,
+        "metrics": metrics
+    }
+    baidu_link_set: set[str] = options["baidu_link_set"] if "baidu_link_set" in options else set()
+    dedupe_index: DedupeIndex = options["dedupe_index"] if "dedupe_index" in options else None
+    # the links of earlier keywords tell extractSearchBaiduLinks which links are new
+    extract_options["baidu_link_set"] = baidu_link_set
+    for name in ["early_stop_pages", "early_stop_min_new_links", "page_budget", "dedupe_index"]:
+        if name in options:
+            extract_options[name] = options[name]
+    try:
+        if parallel_browsers > 1:
+            cpu_count = os.cpu_count() or 1
+            if parallel_browsers > cpu_count:
+                logger.warning(f"parallel_browsers ({parallel_browsers}) exceeds the number of CPUs ({cpu_count})")
+            # every worker drives its own browser and takes the healthiest proxy for each search,
+            # results are yielded in search_list order so dedupe and output match the serial mode.
+            # Early stop and redistribution would depend on which links the other workers found first,
+            # so they are off and every keyword loads max_pages pages
+            if ("early_stop_pages" in extract_options and extract_options["early_stop_pages"]) or ("page_budget" in extract_options and extract_options["page_budget"] is not None):
+                logger.warning("early_stop_pages and redistribute_pages are ignored with parallel_browsers")
+            extract_options = {**extract_options, "early_stop_pages": 0, "page_budget": None}
+            jobs = Queue()
+            results = []
+            for search in search_list:
+                result = Future()
+                jobs.put(("inurl: " + search if inurl else search, result))
+                results.append((search, result))
+            stop_event = threading.Event()
+            workers = []
+            for i in range(min(parallel_browsers, len(search_list))):
+                worker = threading.Thread(target=extractBaiduLinksWorker, args=(logger, proxy_pool, jobs, stop_event, max_pages, extract_options), daemon=True)
+                worker.start()
+                workers.append(worker)
+            try:
+                for search, result in results:
+                    for link, page in trackSearchProgress(search, result.result(), options):
+                        if isNewLink(link, baidu_link_set, dedupe_index):
+                            yield (link, search, page)
+            finally:
+                stop_event.set()
+                for search, result in results:
+                    result.cancel()
+                for worker in workers:
+                    worker.join()
+        else:
+            for search in search_list:
+                s = "inurl: " + search if inurl else search
+                for link, page in trackSearchProgress(search, extractSearchBaiduLinks(logger, s, max_pages, proxy_pool.acquire(), extract_options), options):
+                    if isNewLink(link, baidu_link_set, dedupe_index):
+                        yield (link, search, page)
+    finally:
+        if own_pool:
+            browser_pool.close()
+            stats = browser_pool.stats()
+            logger.info(f"browsers launched: {stats['launched']}, startup time: {stats['launch_seconds']:.2f}s, recycled: {stats['recycled']}")
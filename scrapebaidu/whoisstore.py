@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+
+import sqlite3
+import time
+import csv
+import os
+from datetime import datetime
+from collections.abc import Iterable
+from .domains import PublicSuffixList
+
+DAY = 24*3600
+
+class WhoisStore:
+    # whois results keyed by the domain whois is queried for: the registrable domain of a host
+    # with a public suffix list, the host itself without it; next_check tells when a domain has to be queried again
+    def __init__(self, filepath: str, options: dict = []):
+        self.public_suffix_list: PublicSuffixList = options["public_suffix_list"] if "public_suffix_list" in options else None
+        self.expired_ttl: float = options["expired_ttl"] if "expired_ttl" in options else DAY
+        self.no_expires_ttl: float = options["no_expires_ttl"] if "no_expires_ttl" in options else 30*DAY
+        self.not_found_ttl: float = options["not_found_ttl"] if "not_found_ttl" in options else 7*DAY
+        self.failed_ttl: float = options["failed_ttl"] if "failed_ttl" in options else DAY
+        self.commit_interval: int = options["commit_interval"] if "commit_interval" in options else 100
+        self.changes = 0
+        # exportCsv writes the domains checked since the store was opened
+        self.opened_at = time.time()
+        self.db = sqlite3.connect(filepath, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS whois (
+            domain TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            expires TEXT,
+            expires_str TEXT,
+            query_output TEXT,
+            checked_at REAL NOT NULL,
+            next_check REAL NOT NULL
+        )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS whois_status ON whois (status)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS whois_checked_at ON whois (checked_at)")
+        self.db.commit()
+
+    def domain(self, host: str) -> str:
+        return self.public_suffix_list.registrableDomain(host) if self.public_suffix_list is not None else host
+
+    def get(self, domain: str) -> dict:
+        row = self.db.execute("SELECT domain, status, expires, expires_str, query_output, checked_at, next_check FROM whois WHERE domain = ?", (domain,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(["domain", "status", "expires", "expires_str", "query_output", "checked_at", "next_check"], row))
+
+    def isDue(self, host: str, now: float = None) -> bool:
+        row = self.db.execute("SELECT next_check FROM whois WHERE domain = ?", (self.domain(host),)).fetchone()
+        return row is None or row[0] <= (now or time.time())
+
+    def filterHosts(self, host_list: Iterable[str]) -> Iterable[str]:
+        now = time.time()
+        for host in host_list:
+            if host and self.isDue(host, now):
+                yield host
+
+    def upsert(self, host: str, status: str, whois_result, now: float = None):
+        now = now or time.time()
+        expires = None
+        expires_str = None
+        query_output = None
+        if status == 'OK':
+            expires_str = whois_result['expires_str']
+            query_output = '\n'.join(whois_result['query_output'])
+            if whois_result['expires'] is not None:
+                expires = whois_result['expires'].isoformat()
+                expires_timestamp = datetime.timestamp(whois_result['expires'])
+                # not expired domains are checked again when they expire
+                next_check = expires_timestamp if expires_timestamp > now else now + self.expired_ttl
+            else:
+                status = 'NO_EXPIRES'
+                next_check = now + self.no_expires_ttl
+        elif status == 'NOT_FOUND':
+            query_output = whois_result
+            next_check = now + self.not_found_ttl
+        else:
+            query_output = whois_result
+            next_check = now + self.failed_ttl
+        self.db.execute("INSERT OR REPLACE INTO whois (domain, status, expires, expires_str, query_output, checked_at, next_check) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (self.domain(host), status, expires, expires_str, query_output, now, next_check))
+        self.changes += 1
+        if self.changes >= self.commit_interval:
+            self.commit()
+
+    def importNotExpired(self, filepath: str):
+        # rows of an old baidu_whois_not_expired.csv: host, status, expires, expires_str, query_output
+        now = time.time()
+        with open(filepath, "r") as fp:
+            reader = csv.reader(fp)
+            for row in reader:
+                if len(row) > 2 and row[0].strip():
+                    try:
+                        expires = datetime.fromisoformat(row[2].strip())
+                    except ValueError:
+                        # a row that was not written by saveWhoisForHosts, its host is checked again
+                        continue
+                    self.db.execute("INSERT OR IGNORE INTO whois (domain, status, expires, expires_str, query_output, checked_at, next_check) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (self.domain(row[0].strip()), 'OK', expires.isoformat(), row[3] if len(row) > 3 else '', row[4] if len(row) > 4 else '', now, datetime.timestamp(expires)))
+        self.commit()
+
+    def exportCsv(self, dir: str, since: float = None):
+        # the same files saveWhoisForHosts writes, with the domains checked since `since`
+        # (by default, since the store was opened)
+        now = time.time()
+        since = self.opened_at if since is None else since
+        files = {}
+        writers = {}
+        try:
+            for name in ["expired", "not_found", "failed", "no_expires", "not_expired"]:
+                files[name] = open(os.path.join(dir, f"baidu_whois_{name}.csv"), "w", newline='')
+                writers[name] = csv.writer(files[name], quoting=csv.QUOTE_ALL)
+            for domain, status, expires, expires_str, query_output in self.db.execute("SELECT domain, status, expires, expires_str, query_output FROM whois WHERE checked_at >= ? ORDER BY domain", (since,)):
+                if status == 'OK':
+                    if datetime.timestamp(datetime.fromisoformat(expires)) <= now:
+                        writers["expired"].writerow([domain, expires, expires_str, query_output])
+                    else:
+                        writers["not_expired"].writerow([domain, status, expires, expires_str, query_output])
+                elif status == 'NOT_FOUND':
+                    writers["not_found"].writerow([domain, query_output])
+                elif status == 'NO_EXPIRES':
+                    writers["no_expires"].writerow([domain, status, expires_str, query_output])
+                else:
+                    writers["failed"].writerow([domain, query_output])
+        finally:
+            for fp in files.values():
+                fp.close()
+
+    def commit(self):
+        self.db.commit()
+        self.changes = 0
+
+    def flush(self):
+        self.commit()
+
+    def close(self):
+        self.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+
+from logging import Logger
+from re import Pattern
+from collections.abc import Callable
+import asyncio
+import threading
+import sqlite3
+import socket
+import os
+from .workqueue import SqliteWorkQueue, Task
+from .whoisstore import WhoisStore
+from .dedupeindex import DedupeIndex
+from .browserpool import BrowserPool
+from .utils import extractBaiduLinks, checkBaiduLinks, getWhoisForHosts
+
+class LeaseKeeper:
+    # extends the leases of the tasks being processed every lease_seconds / 3 from a thread of its own,
+    # so a task keeps its lease however long it goes without a result (slow pages, captchas, retries)
+    def __init__(self, logger: Logger, work_queue: SqliteWorkQueue, tasks: list[Task]):
+        self.logger = logger
+        self.work_queue = work_queue
+        self.tasks = tasks
+        # keys of tasks another worker has taken over
+        self.lost: set[str] = set()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stop_event.wait(self.work_queue.lease_seconds / 3):
+            for task in self.tasks:
+                if task.key in self.lost:
+                    continue
+                try:
+                    if not self.work_queue.extend(task):
+                        self.lost.add(task.key)
+                        self.logger.warning(f"lease of {task.kind} '{task.key}' lost, another worker takes it")
+                except sqlite3.Error as e:
+                    # tried again on the next tick, the lease lasts lease_seconds
+                    self.logger.warning(f"lease of {task.kind} '{task.key}' not extended: {e}")
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop_event.set()
+        self.thread.join()
+
+def runWorker(logger: Logger, work_queue: SqliteWorkQueue, max_pages: int, proxy_list: list[str], reject_patterns: list[Pattern], loop: asyncio.AbstractEventLoop, options: dict = []) -> dict[str, int]:
+    # takes keywords, links and hosts from the work queue until none are pending or leased by any worker;
+    # hosts and links go first, so work that was started is finished before new keywords are searched
+    worker_id: str = options["worker_id"] if "worker_id" in options else f"{socket.gethostname()}-{os.getpid()}"
+    extract_options: dict = options["extract_options"] if "extract_options" in options else {}
+    check_options: dict = options["check_options"] if "check_options" in options else {}
+    whois_options: dict = options["whois_options"] if "whois_options" in options else {}
+    resolve_links: bool = options["resolve_links"] if "resolve_links" in options else True
+    resolve_tasks: int = options["resolve_tasks"] if "resolve_tasks" in options else 6
+    whois_hosts: bool = options["whois_hosts"] if "whois_hosts" in options else False
+    whois_tasks: int = options["whois_tasks"] if "whois_tasks" in options else 3
+    whois_timeout: int = options["whois_timeout"] if "whois_timeout" in options else 10
+    batch_size: int = options["batch_size"] if "batch_size" in options else 50
+    poll_interval: float = options["poll_interval"] if "poll_interval" in options else 5
+    stop_event: threading.Event = options["stop_event"] if "stop_event" in options else threading.Event()
+    # hosts that need no whois: excluded, checked recently or seen by earlier runs
+    exclude_hosts: set[str] = options["exclude_hosts"] if "exclude_hosts" in options else set()
+    whois_store: WhoisStore = options["whois_store"] if "whois_store" in options else None
+    dedupe_index: DedupeIndex = options["dedupe_index"] if "dedupe_index" in options else None
+
+    # one browser pool for all keyword tasks of the worker, so its browsers stay warm between tasks
+    engine: str = extract_options["engine"] if "engine" in extract_options else "browser"
+    browser_pool: BrowserPool = extract_options["browser_pool"] if "browser_pool" in extract_options else None
+    own_pool = engine == "browser" and browser_pool is None
+    if own_pool:
+        browser_pool = BrowserPool(logger, max(1, len(proxy_list)), proxy_list, {
+            "headless": extract_options["headless"] if "headless" in extract_options else False,
+            "max_uses": extract_options["browser_max_uses"] if "browser_max_uses" in extract_options else 50,
+            "metrics": extract_options["metrics"] if "metrics" in extract_options else None
+        })
+        extract_options = {**extract_options, "browser_pool": browser_pool}
+
+    kinds = ["keyword"] + (["link"] if resolve_links else []) + (["host"] if resolve_links and whois_hosts else [])
+    processed = {kind: 0 for kind in kinds}
+
+    def extract(task: Task, leases: LeaseKeeper):
+        links = []
+        for link, search, pn in extractBaiduLinks(logger, [task.key], max_pages, proxy_list, {**extract_options, "baidu_link_set": set()}):
+            links.append((link, {"search": search, "pn": pn}))
+            if task.key in leases.lost:
+                # another worker searches the keyword
+                return
+        # without resolve_links the links are recorded as done, the export still finds them
+        if work_queue.complete(task, {"links": len(links)}, {"link": links} if resolve_links else {}, {} if resolve_links else {"link": links}):
+            processed["keyword"] += 1
+
+    def resolve(tasks: list[Task], leases: LeaseKeeper):
+        leased = {task.key: task for task in tasks}
+        rows = [(task.key, task.payload["search"] if task.payload else '') for task in tasks]
+        for requestURL, responseStatus, responseResult in checkBaiduLinks(logger, rows, reject_patterns, resolve_tasks, loop, check_options):
+            task = leased.pop(requestURL, None)
+            if task is None:
+                continue
+            children = {}
+            if whois_hosts and responseStatus == 'OK' and responseResult['host']:
+                children["host"] = [(responseResult['host'], None)]
+            if work_queue.complete(task, [responseStatus, responseResult], children):
+                processed["link"] += 1
+        for task in leased.values():
+            work_queue.fail(task, "no result")
+
+    def checkHosts(tasks: list[Task], leases: LeaseKeeper):
+        leased = {}
+        for task in tasks:
+            host = task.key
+            if host in exclude_hosts or (whois_store is not None and not whois_store.isDue(host)) or (dedupe_index is not None and "host:" + host in dedupe_index):
+                work_queue.complete(task, None)
+            else:
+                leased[host] = task
+        for host, status, whois_result in getWhoisForHosts(logger, list(leased), whois_tasks, loop, whois_timeout, whois_options):
+            if work_queue.complete(leased.pop(host), [status, whois_result]):
+                processed["host"] += 1
+        for task in leased.values():
+            work_queue.fail(task, "no result")
+
+    def run(tasks: list[Task], process: Callable):
+        try:
+            with LeaseKeeper(logger, work_queue, tasks) as leases:
+                process(tasks, leases)
+        except Exception as e:
+            # an error counts as an attempt, the tasks are tried again later
+            logger.warning(f"{tasks[0].kind} tasks failed: {type(e).__name__}: {e}")
+            for task in tasks:
+                work_queue.fail(task, f"{type(e).__name__}: {e}")
+        except BaseException:
+            # a worker that is stopped gives its tasks back
+            for task in tasks:
+                work_queue.release(task)
+            raise
+
+    stages = [("host", batch_size, checkHosts), ("link", batch_size, resolve), ("keyword", 1, lambda tasks, leases: extract(tasks[0], leases))]
+    logger.info(f"worker '{worker_id}' started")
+    try:
+        while not stop_event.is_set():
+            worked = False
+            for kind, count, process in stages:
+                if kind in kinds:
+                    tasks = work_queue.lease(kind, worker_id, count)
+                    if tasks:
+                        run(tasks, process)
+                        worked = True
+                        break
+            if not worked:
+                if work_queue.isDone(kinds):
+                    break
+                # other workers still hold leases, their tasks come back if they crash
+                stop_event.wait(poll_interval)
+    finally:
+        if own_pool:
+            browser_pool.close()
+            stats = browser_pool.stats()
+            logger.info(f"browsers launched: {stats['launched']}, startup time: {stats['launch_seconds']:.2f}s, recycled: {stats['recycled']}")
+    logger.info(f"worker '{worker_id}' done: " + ", ".join(f"{count} {kind}s" for kind, count in processed.items()))
+    return processed
+
+def exportWorkQueue(work_queue: SqliteWorkQueue, on_link: Callable = None, on_checked: Callable = None, on_whois: Callable = None):
+    # the results of all workers, in the form the single-process stages produce them
+    if on_link is not None:
+        for link, payload, result in work_queue.tasks("link", ["pending", "leased", "done", "failed"]):
+            on_link((link, payload["search"], payload["pn"]))
+    if on_checked is not None:
+        for link, payload, result in work_queue.tasks("link"):
+            if result is not None:
+                on_checked((link, result[0], result[1]))
+    if on_whois is not None:
+        for host, payload, result in work_queue.tasks("host"):
+            if result is not None:
+                on_whois((host, result[0], result[1]))
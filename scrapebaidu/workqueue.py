@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+
+from collections.abc import Iterable
+from datetime import datetime
+import sqlite3
+import threading
+import json
+import time
+import uuid
+
+def dumpValue(value) -> str:
+    # results keep their datetimes, whois results carry the expiry date
+    def default(value):
+        if isinstance(value, datetime):
+            return {"$datetime": value.isoformat()}
+        raise TypeError(f"{type(value).__name__} is not JSON serializable")
+    return json.dumps(value, ensure_ascii=False, default=default)
+
+def loadValue(text: str):
+    def object_hook(value: dict):
+        return datetime.fromisoformat(value["$datetime"]) if len(value) == 1 and "$datetime" in value else value
+    return json.loads(text, object_hook=object_hook) if text is not None else None
+
+class Task:
+    def __init__(self, kind: str, key: str, payload, attempts: int, lease_id: str):
+        self.kind = kind
+        self.key = key
+        self.payload = payload
+        self.attempts = attempts
+        self.lease_id = lease_id
+
+class SqliteWorkQueue:
+    # keywords, links and hosts shared by the workers of a run, in one SQLite file.
+    # A worker leases tasks for lease_seconds; a task whose lease ran out (the worker crashed or hung)
+    # is leased again, up to max_attempts times. A result is accepted only with the current lease,
+    # in the same transaction that adds the follow-up tasks, so every task has its effects once.
+    def __init__(self, filepath: str, options: dict = []):
+        self.lease_seconds: float = options["lease_seconds"] if "lease_seconds" in options else 600
+        self.max_attempts: int = options["max_attempts"] if "max_attempts" in options else 3
+        self.retry_delay: float = options["retry_delay"] if "retry_delay" in options else 30
+        # transactions are started explicitly, BEGIN IMMEDIATE keeps two workers from leasing the same task;
+        # the lock keeps the transactions of threads of one worker (lease extension) apart
+        self.lock = threading.RLock()
+        self.db = sqlite3.connect(filepath, timeout=60, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS work_tasks (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            payload TEXT,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at REAL NOT NULL DEFAULT 0,
+            lease_id TEXT,
+            lease_owner TEXT,
+            lease_until REAL,
+            result TEXT,
+            error TEXT,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (kind, key)
+        )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS work_tasks_state ON work_tasks (kind, state, available_at)")
+
+    def transaction(self):
+        return WorkQueueTransaction(self.db, self.lock)
+
+    def insert(self, kind: str, items: Iterable[tuple[str, object]], state: str, now: float) -> int:
+        added = 0
+        for key, payload in items:
+            cursor = self.db.execute("INSERT OR IGNORE INTO work_tasks (kind, key, payload, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, key, dumpValue(payload), state, now))
+            added += cursor.rowcount
+        return added
+
+    def put(self, kind: str, items: Iterable[tuple[str, object]]) -> int:
+        # (key, payload) pairs; a key that is already queued, done or failed is not added again
+        with self.transaction():
+            return self.insert(kind, items, "pending", time.time())
+
+    def lease(self, kind: str, owner: str, count: int = 1) -> list[Task]:
+        now = time.time()
+        with self.transaction():
+            rows = self.db.execute("""SELECT key, payload, attempts FROM work_tasks
+                WHERE kind = ? AND ((state = 'pending' AND available_at <= ?) OR (state = 'leased' AND lease_until < ?))
+                ORDER BY available_at, rowid LIMIT ?""", (kind, now, now, count)).fetchall()
+            tasks = []
+            for key, payload, attempts in rows:
+                if attempts >= self.max_attempts:
+                    # the last lease ran out as well
+                    self.db.execute("UPDATE work_tasks SET state = 'failed', lease_id = NULL, error = ?, updated_at = ? WHERE kind = ? AND key = ?",
+                        ("lease expired", now, kind, key))
+                    continue
+                lease_id = uuid.uuid4().hex
+                self.db.execute("""UPDATE work_tasks SET state = 'leased', attempts = attempts + 1, lease_id = ?, lease_owner = ?, lease_until = ?, updated_at = ?
+                    WHERE kind = ? AND key = ?""", (lease_id, owner, now + self.lease_seconds, now, kind, key))
+                tasks.append(Task(kind, key, loadValue(payload), attempts + 1, lease_id))
+            return tasks
+
+    def extend(self, task: Task) -> bool:
+        with self.transaction():
+            cursor = self.db.execute("UPDATE work_tasks SET lease_until = ? WHERE kind = ? AND key = ? AND lease_id = ? AND state = 'leased'",
+                (time.time() + self.lease_seconds, task.kind, task.key, task.lease_id))
+            return cursor.rowcount == 1
+
+    def complete(self, task: Task, result = None, children: dict[str, list[tuple[str, object]]] = {}, done_children: dict[str, list[tuple[str, object]]] = {}) -> bool:
+        # False if the lease was lost: another worker has the task now, the result is dropped.
+        # children are new pending tasks, done_children are recorded as done (nothing left to do for them)
+        now = time.time()
+        with self.transaction():
+            cursor = self.db.execute("""UPDATE work_tasks SET state = 'done', result = ?, lease_id = NULL, lease_until = NULL, error = NULL, updated_at = ?
+                WHERE kind = ? AND key = ? AND lease_id = ? AND state = 'leased'""", (dumpValue(result), now, task.kind, task.key, task.lease_id))
+            if cursor.rowcount != 1:
+                return False
+            for kind, items in children.items():
+                self.insert(kind, items, "pending", now)
+            for kind, items in done_children.items():
+                self.insert(kind, items, "done", now)
+            return True
+
+    def fail(self, task: Task, error: str) -> bool:
+        # the task is tried again after retry_delay, doubled with every attempt, until max_attempts
+        now = time.time()
+        with self.transaction():
+            if task.attempts >= self.max_attempts:
+                cursor = self.db.execute("""UPDATE work_tasks SET state = 'failed', lease_id = NULL, lease_until = NULL, error = ?, updated_at = ?
+                    WHERE kind = ? AND key = ? AND lease_id = ? AND state = 'leased'""", (error, now, task.kind, task.key, task.lease_id))
+            else:
+                cursor = self.db.execute("""UPDATE work_tasks SET state = 'pending', lease_id = NULL, lease_until = NULL, error = ?, available_at = ?, updated_at = ?
+                    WHERE kind = ? AND key = ? AND lease_id = ? AND state = 'leased'""",
+                    (error, now + self.retry_delay * 2 ** (task.attempts - 1), now, task.kind, task.key, task.lease_id))
+            return cursor.rowcount == 1
+
+    def release(self, task: Task):
+        # gives a leased task back without counting the attempt, when a worker stops
+        with self.transaction():
+            self.db.execute("""UPDATE work_tasks SET state = 'pending', attempts = attempts - 1, lease_id = NULL, lease_until = NULL, updated_at = ?
+                WHERE kind = ? AND key = ? AND lease_id = ? AND state = 'leased'""", (time.time(), task.kind, task.key, task.lease_id))
+
+    def counts(self, kind: str = None) -> dict[str, dict[str, int]]:
+        rows = self.db.execute("SELECT kind, state, COUNT(*) FROM work_tasks" + (" WHERE kind = ?" if kind else "") + " GROUP BY kind, state",
+            (kind,) if kind else ()).fetchall()
+        counts = {}
+        for kind, state, count in rows:
+            counts.setdefault(kind, {})[state] = count
+        return counts
+
+    def isDone(self, kinds: list[str]) -> bool:
+        # nothing pending or leased, by any worker
+        placeholders = ",".join("?" * len(kinds))
+        row = self.db.execute(f"SELECT COUNT(*) FROM work_tasks WHERE kind IN ({placeholders}) AND state IN ('pending', 'leased')", kinds).fetchone()
+        return row[0] == 0
+
+    def tasks(self, kind: str, states: list[str] = ["done"]) -> Iterable[tuple[str, object, object]]:
+        # (key, payload, result) in the order the tasks were added
+        placeholders = ",".join("?" * len(states))
+        for key, payload, result in self.db.execute(f"SELECT key, payload, result FROM work_tasks WHERE kind = ? AND state IN ({placeholders}) ORDER BY rowid",
+                [kind] + states):
+            yield key, loadValue(payload), loadValue(result)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class WorkQueueTransaction:
+    def __init__(self, db: sqlite3.Connection, lock: threading.RLock):
+        self.db = db
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.db.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self.lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.db.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        finally:
+            self.lock.release()
+
+# work queue backends by the scheme of the work_queue setting; a path without a scheme is a SQLite file
+WORK_QUEUE_BACKENDS = {
+    "sqlite": SqliteWorkQueue
+}
+
+def openWorkQueue(location: str, options: dict = []):
+    scheme, separator, path = location.partition("://")
+    if not separator:
+        scheme, path = "sqlite", location
+    if scheme not in WORK_QUEUE_BACKENDS:
+        raise ValueError(f"Bad work queue backend: '{scheme}'")
+    return WORK_QUEUE_BACKENDS[scheme](path, options)
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+#
+# Keys of the dedupe index survive a run that is not closed.
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from scrapebaidu import DedupeIndex
+
+def test_keys_are_saved_while_the_run_goes_on():
+    with tempfile.TemporaryDirectory() as dir:
+        filepath = os.path.join(dir, "baidu_dedupe_index.sqlite")
+        dedupe_index = DedupeIndex(filepath, {"capacity": 1000, "save_keys": 10})
+        for i in range(25):
+            dedupe_index.add(f"link:{i}")
+        # the run crashes before close()
+        reopened = DedupeIndex(filepath, {"read_only": True})
+        assert all(f"link:{i}" in reopened for i in range(20))
+        reopened.close()
+        dedupe_index.close()
+        reopened = DedupeIndex(filepath, {"read_only": True})
+        assert all(f"link:{i}" in reopened for i in range(25))
+        reopened.close()
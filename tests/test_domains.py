@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+#
+# Registrable domains with the built-in and with a full public suffix list.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from scrapebaidu import PublicSuffixList
+from scrapebaidu.utils import groupHostsByDomain
+
+def test_listed_suffixes():
+    psl = PublicSuffixList()
+    assert psl.registrableDomain("a.b.example.com.cn:8080") == "example.com.cn"
+    assert psl.registrableDomain("www.example.cn") == "example.cn"
+    assert psl.registrableDomain("www.example.com") == "example.com"
+    assert psl.registrableDomain("example.mx") == "example.mx"
+    assert psl.registrableDomain("1.2.3.4") == "1.2.3.4"
+
+def test_unlisted_cctld_suffixes_are_not_registrable_domains():
+    psl = PublicSuffixList()
+    for host in ["a.example.com.mx", "b.other.com.mx", "shop.co.il", "x.y.com.ar", "www.foo.com.pk"]:
+        assert psl.registrableDomain(host) == host
+
+def test_unlisted_cctld_hosts_are_checked_one_by_one():
+    domain_hosts = groupHostsByDomain(["a.example.com.mx", "b.other.com.mx", "www.example.com.cn", "example.com.cn"], PublicSuffixList())
+    assert domain_hosts == {
+        "a.example.com.mx": ["a.example.com.mx"],
+        "b.other.com.mx": ["b.other.com.mx"],
+        "example.com.cn": ["www.example.com.cn", "example.com.cn"],
+    }
+
+def test_full_list_rules():
+    psl = PublicSuffixList("// ===BEGIN ICANN DOMAINS===\nmx\ncom.mx\nil\nco.il\n*.ck\n!www.ck\n")
+    assert psl.registrableDomain("a.example.com.mx") == "example.com.mx"
+    assert psl.registrableDomain("shop.co.il") == "shop.co.il"
+    assert psl.registrableDomain("www.shop.co.il") == "shop.co.il"
+    assert psl.registrableDomain("a.b.c.ck") == "b.c.ck"
+    assert psl.registrableDomain("www.ck") == "www.ck"
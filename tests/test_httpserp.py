@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+#
+# The http engine against a stub SERP server on localhost.
+
+import os
+import sys
+import asyncio
+import logging
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from scrapebaidu import ProxyPool, aioExtractSearchBaiduLinksHttp
+from scrapebaidu.httpserp import createSerpSession, isBaiduCaptchaUrl
+
+logger = logging.getLogger("test-httpserp")
+
+PAGES = 3
+LINKS_PER_PAGE = 4
+
+def serpPage(search: str, pn: int) -> str:
+    page = pn // 10
+    anchors = "".join(f'<h3><a href="http://www.baidu.com/link?url={search}-{page}-{i}">Result {i}</a></h3>' for i in range(LINKS_PER_PAGE))
+    pagination = "".join(f'<a href="/s?wd={search}&amp;pn={p}0">{p+1}</a>' for p in range(1, PAGES))
+    return f'<html><body><div id="content_left">{anchors}</div><div id="page">{pagination}</div></body></html>'
+
+async def handleSerp(request: web.Request) -> web.Response:
+    return web.Response(text=serpPage(request.query.get("wd", ""), int(request.query.get("pn", "0"))), content_type="text/html")
+
+async def startSerpServer() -> tuple[web.AppRunner, str]:
+    app = web.Application()
+    app.router.add_get("/s", handleSerp)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+async def startDroppingProxy() -> tuple[asyncio.AbstractServer, str]:
+    # a proxy that reads the request and closes the connection without an answer
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.close()
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    host, port = server.sockets[0].getsockname()[:2]
+    return server, f"{host}:{port}"
+
+async def collect(search: str, max_pages: int, proxy: str = '', extract_options: dict = {}) -> list[tuple[str, str]]:
+    session = createSerpSession({"browser_timeout": 5})
+    try:
+        return [item async for item in aioExtractSearchBaiduLinksHttp(logger, search, max_pages, session, proxy, extract_options)]
+    finally:
+        await session.close()
+
+def test_extracts_links_of_all_pages():
+    async def run():
+        runner, serp_url = await startSerpServer()
+        try:
+            return await collect("kw", PAGES, '', {"baidu_url": serp_url})
+        finally:
+            await runner.cleanup()
+    links = asyncio.run(run())
+    assert len(links) == PAGES * LINKS_PER_PAGE
+    assert links[0] == ("https://www.baidu.com/link?url=kw-0-0", '')
+    assert links[-1][0] == f"https://www.baidu.com/link?url=kw-{PAGES-1}-{LINKS_PER_PAGE-1}"
+
+def test_max_pages_limits_paging():
+    async def run():
+        runner, serp_url = await startSerpServer()
+        try:
+            return await collect("kw", 1, '', {"baidu_url": serp_url})
+        finally:
+            await runner.cleanup()
+    assert len(asyncio.run(run())) == LINKS_PER_PAGE
+
+def test_dropped_connection_fails_the_proxy():
+    async def run():
+        runner, serp_url = await startSerpServer()
+        server, proxy = await startDroppingProxy()
+        proxy_pool = ProxyPool(logger, [proxy], {"failure_threshold": 1})
+        try:
+            links = await collect("kw", PAGES, proxy_pool.acquire(), {"baidu_url": serp_url, "proxy_pool": proxy_pool})
+        finally:
+            server.close()
+            await server.wait_closed()
+            await runner.cleanup()
+        return links, proxy_pool.stats()[proxy]
+    links, stats = asyncio.run(run())
+    assert links == []
+    assert stats["failures"] == 1
+    assert stats["cooldowns"] == 1
+
+def test_captcha_urls():
+    assert isBaiduCaptchaUrl("https://wappass.baidu.com/static/captcha/tuxing.html?ak=1")
+    assert isBaiduCaptchaUrl("https://verify.baidu.com/")
+    assert isBaiduCaptchaUrl("http://127.0.0.1:8080/verify?from=s", "http://127.0.0.1:8080")
+    # "captcha" in a search or on another site is not Baidu's captcha
+    assert not isBaiduCaptchaUrl("https://www.baidu.com/s?wd=captcha")
+    assert not isBaiduCaptchaUrl("https://example.com/captcha/solver")
+    assert not isBaiduCaptchaUrl("https://shop.example.com/?q=captcha")
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+#
+# Timestamps written to and read back from the typed output formats.
+
+import os
+import sys
+import tempfile
+import pytest
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from scrapebaidu.records import openRecordWriter, readRecords
+
+COLUMNS = [("host", "string"), ("expires", "timestamp")]
+
+def test_parquet_timestamps_keep_their_instant():
+    pytest.importorskip("pyarrow")
+    aware = datetime(2030, 1, 1, 12, tzinfo=timezone(timedelta(hours=8)))
+    naive = datetime(2030, 1, 1, 12)
+    with tempfile.TemporaryDirectory() as dir:
+        filepath = os.path.join(dir, "baidu_whois_not_expired.csv")
+        writer = openRecordWriter(filepath, COLUMNS, "parquet")
+        writer.write(["a.example.com", aware])
+        writer.write(["b.example.com", naive])
+        writer.write(["c.example.com", None])
+        writer.close()
+        records = list(readRecords(filepath, COLUMNS, "parquet"))
+    assert [record["expires"].timestamp() if record["expires"] else None for record in records] == [aware.timestamp(), naive.timestamp(), None]
+    assert all(record["expires"].tzinfo is not None for record in records[:2])
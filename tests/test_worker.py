@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2022 Vitaly Yakovlev <vitaly@optinsoft.net>
+#
+# scrapebaidu - scrapes baidu search results and resolves target links.
+#
+# Leases of the shared work queue while a worker is busy.
+
+import os
+import sys
+import time
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from scrapebaidu.workqueue import SqliteWorkQueue
+from scrapebaidu.worker import LeaseKeeper
+
+logger = logging.getLogger("test-worker")
+
+def test_lease_is_kept_without_results():
+    with tempfile.TemporaryDirectory() as dir:
+        with SqliteWorkQueue(os.path.join(dir, "work_queue.sqlite"), {"lease_seconds": 0.3}) as work_queue:
+            work_queue.put("keyword", [("kw", None)])
+            tasks = work_queue.lease("keyword", "worker-1")
+            with LeaseKeeper(logger, work_queue, tasks) as leases:
+                # the keyword yields nothing for three lease periods
+                time.sleep(1)
+                assert work_queue.lease("keyword", "worker-2") == []
+            assert not leases.lost
+            assert work_queue.complete(tasks[0])
+
+def test_lost_lease_is_reported():
+    with tempfile.TemporaryDirectory() as dir:
+        with SqliteWorkQueue(os.path.join(dir, "work_queue.sqlite"), {"lease_seconds": 0.3}) as work_queue:
+            work_queue.put("keyword", [("kw", None)])
+            tasks = work_queue.lease("keyword", "worker-1")
+            time.sleep(0.4)
+            assert len(work_queue.lease("keyword", "worker-2")) == 1
+            with LeaseKeeper(logger, work_queue, tasks) as leases:
+                time.sleep(0.3)
+            assert leases.lost == {"kw"}
+            assert not work_queue.complete(tasks[0])